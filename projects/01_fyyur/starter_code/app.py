@@ -2,44 +2,119 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import json
-import babel
-from datetime import datetime
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify
+import queue
+import atexit
+import time
+import sqlite3
+import base64
+import hashlib
+import click
+from collections import Counter
+from datetime import datetime, timedelta
+from dateutil.parser import parse as parse_datetime
+from functools import wraps
+from itertools import groupby
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, session, make_response, stream_with_context
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.inspection import inspect
+from sqlalchemy.sql.expression import FunctionElement
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import is_resource_modified
+from jinja2 import FileSystemBytecodeCache
 from flask_migrate import Migrate
 import logging
-from logging import Formatter, FileHandler
+from logging import Formatter
 from forms import *
+from cache import PageCache
+from formatting import DateTimeFormatter
+from importer import read_rows, batches
+from instrumentation import Instrumentation, query_budget
+from intervals import IntervalIndex
+from partitions import month_start, add_months, monthly_partitions, create_partition, detach_partition
+from routing import RoutingSQLAlchemy, read_only
+from matching import MatchIndex
+from refreshing import RefreshingIndex
+from calendars import vevent, vcalendar
+from autocomplete import PrefixIndex
+from async_logging import DroppingQueueHandler, BatchingRotatingFileHandler, BatchingListener, RequestTimer
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
 app = Flask(__name__)
-moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+if app.config['TEMPLATE_CACHE_DIR']:
+  # compiled templates are shared through the filesystem so that new workers
+  # skip compiling them; jinja_options only apply before jinja_env is created
+  try:
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    if not os.access(app.config['TEMPLATE_CACHE_DIR'], os.W_OK):
+      raise PermissionError(app.config['TEMPLATE_CACHE_DIR'])
+  except OSError as e:
+    app.logger.warning('Template bytecode cache disabled: {0}'.format(e))
+  else:
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR']))
+moment = Moment(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+instrumentation = Instrumentation(app, slowest=app.config['SLOW_QUERY_LOG_SIZE'])
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+  # SQLite only enforces foreign keys, and so ON DELETE CASCADE, when asked to
+  if isinstance(dbapi_connection, sqlite3.Connection):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+def default_end_time(context):
+    return context.get_current_parameters()['start_time'] + timedelta(minutes=app.config['DEFAULT_SHOW_DURATION'])
+
+class utc_now(FunctionElement):
+    # server side default of the naive UTC updated_at columns; CURRENT_TIMESTAMP
+    # is UTC on SQLite, while Postgres gives the session's local time
+    type = db.DateTime()
+
+@compiles(utc_now)
+def compile_utc_now(element, compiler, **kw):
+    return 'CURRENT_TIMESTAMP'
+
+@compiles(utc_now, 'postgresql')
+def compile_utc_now_postgresql(element, compiler, **kw):
+    return "timezone('utc', CURRENT_TIMESTAMP)"
+
 class Show(db.Model):
     __tablename__ = 'Show'
-    venue_id = db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True)
-    artist_id = db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True)
+    venue_id = db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
     start_time = db.Column('start_time', db.DateTime, primary_key=True)
+    end_time = db.Column(db.DateTime, nullable=False, default=default_end_time)
+    counted_as_past = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=utc_now())
     artist = db.relationship('Artist')
     venue = db.relationship('Venue')
+    __table_args__ = (
+        db.Index('ix_Show_start_time_venue_id_artist_id', 'start_time', 'venue_id', 'artist_id'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        {'postgresql_partition_by': 'RANGE (start_time)'}
+    )
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
     id = db.Column(db.Integer, primary_key=True)
-    genres = db.relationship('VenueGenre', cascade='all, delete-orphan')
+    genres = db.relationship('VenueGenre', cascade='all, delete-orphan', passive_deletes=True)
     name = db.Column(db.String(), nullable=False)
     city = db.Column(db.String(), nullable=False)
     state = db.Column(db.String(), nullable=False)
@@ -50,18 +125,28 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
     image_link = db.Column(db.String())
-    shows = db.relationship('Show')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    genre_mask = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=utc_now())
+    shows = db.relationship('Show', passive_deletes='all')
+    __table_args__ = (
+        db.Index('ix_Venue_state_genre_mask', 'state', 'genre_mask'),
+    )
 
 class VenueGenre(db.Model):
     __tablename__ = 'VenueGenre'
     id = db.Column(db.Integer, primary_key=True)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'))
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), index=True)
     name = db.Column(db.String(), nullable=False)
+    __table_args__ = (
+        db.Index('ix_VenueGenre_name_venue_id', 'name', 'venue_id'),
+    )
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
     id = db.Column(db.Integer, primary_key=True)
-    genres = db.relationship('ArtistGenre', cascade = 'all, delete-orphan')
+    genres = db.relationship('ArtistGenre', cascade = 'all, delete-orphan', passive_deletes=True)
     name = db.Column(db.String(), nullable=False)
     city = db.Column(db.String(), nullable=False)
     state = db.Column(db.String(), nullable=False)
@@ -71,26 +156,872 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String())
     image_link = db.Column(db.String())
-    shows = db.relationship('Show')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    genre_mask = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=utc_now())
+    shows = db.relationship('Show', passive_deletes='all')
+    __table_args__ = (
+        db.Index('ix_Artist_name_id', 'name', 'id'),
+        db.Index('ix_Artist_state_genre_mask', 'state', 'genre_mask'),
+    )
 
 class ArtistGenre(db.Model):
     __tablename__ = 'ArtistGenre'
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'))
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), index=True)
     name = db.Column(db.String(), nullable=False)
+    __table_args__ = (
+        db.Index('ix_ArtistGenre_name_artist_id', 'name', 'artist_id'),
+    )
+
+class ShowListing(db.Model):
+    # read model of /shows; see the Show listing section
+    __tablename__ = 'ShowListing'
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+    start_time = db.Column(db.DateTime, primary_key=True)
+    end_time = db.Column(db.DateTime, nullable=False)
+    artist_name = db.Column(db.String(), nullable=False)
+    artist_image_link = db.Column(db.String())
+    venue_name = db.Column(db.String(), nullable=False)
+    __table_args__ = (
+        db.Index('ix_ShowListing_start_time_venue_id_artist_id', 'start_time', 'venue_id', 'artist_id'),
+        db.Index('ix_ShowListing_artist_id', 'artist_id'),
+    )
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(), nullable=False, unique=True)
+
+# Genre ids follow the order of genre_choices, so new genres may only be
+# appended there. Venue.genre_mask and Artist.genre_mask have bit (id - 1)
+# set for each of their genres.
+genre_ids = {name: id for id, (name, label) in enumerate(genre_choices, 1)}
+
+@event.listens_for(Genre.__table__, 'after_create')
+def seed_genres(table, connection, **kw):
+    connection.execute(table.insert(), [{'id': id, 'name': name} for name, id in genre_ids.items()])
+
+def genre_mask(names):
+    return sum(1 << (genre_ids[name] - 1) for name in set(names) if name in genre_ids)
+
+def genre_names(mask):
+    return [name for name, id in genre_ids.items() if mask & (1 << (id - 1))]
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def venue_areas():
+  # one query for all venues, folded into the area -> venues structure
+  # expected by pages/venues.html
+  rows = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count).order_by(Venue.state, Venue.city, Venue.name, Venue.id).all()
+  areas = []
+  for (city, state), area_rows in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      'city': city,
+      'state': state,
+      'venues': [{'id': row.id, 'name': row.name, 'num_upcoming_shows': row.upcoming_shows_count} for row in area_rows]
+    })
+  return areas
+
+def search(model, genre_model, term, page=1):
+  # matches the term against name, "city, state" and genres and returns one
+  # ranked page of them with a count capped at SEARCH_COUNT_LIMIT, in one query
+  per_page = app.config['SEARCH_PAGE_SIZE']
+  count_limit = app.config['SEARCH_COUNT_LIMIT']
+  page = max(page, 1)
+  pattern = '%{0}%'.format(term)
+  location = model.city + ', ' + model.state
+  owner = genre_model.venue_id if model is Venue else genre_model.artist_id
+  if db.engine.dialect.name == 'postgresql':
+    # trigram word distance (1 - word_similarity), in whose order the gist
+    # indexes return rows. Rows at the same distance are left in index order:
+    # sorting them by id would read every row at that distance
+    name_distance = db.literal(term).op('<<->', return_type=db.Float)(model.name)
+    location_distance = db.literal(term).op('<<->', return_type=db.Float)(location.self_group())
+    order = ('distance',)
+  else:
+    name_distance = db.case([(model.name.ilike('{0}%'.format(term)), 0.0)], else_=0.5)
+    location_distance = db.literal(0.5)
+    order = ('distance', 'id')
+  # (id, distance, filter, order) per index: the trigram indexes on name and
+  # location, and ix_*Genre_name_* once for each genre the term is part of.
+  # Genre-only matches rank last, by id
+  branches = [
+    (model.id, name_distance, model.name.ilike(pattern), order),
+    (model.id, location_distance, location.ilike(pattern), order)
+  ] + [(owner, db.literal(1.0), genre_model.name == name, ('id',)) for name in genre_ids if term.lower() in name.lower()]
+  # each branch stops at the rows the requested page, or the capped count,
+  # can need and numbers them in the order read, so the database reads that
+  # many rows of each index rather than every match. A match ranks by its best
+  # (distance, position, branch), which keeps the pages of one search
+  # consistent with each other
+  limit = max(page * per_page + 1, count_limit + 1)
+  entries = []
+  for number, (id, distance, condition, order) in enumerate(branches):
+    columns = {'id': id.label('id'), 'distance': distance.label('distance')}
+    rows = db.session.query(*columns.values()).filter(condition).order_by(*[columns[key] for key in order]).limit(limit).subquery()
+    position = db.func.row_number().over(order_by=[rows.c[key] for key in order])
+    entries.append(db.session.query(rows.c.id.label('id'), rows.c.distance.label('distance'), position.label('position'), db.literal(number).label('branch')))
+  entries = entries[0].union_all(*entries[1:]).subquery()
+  best = db.func.row_number().over(partition_by=entries.c.id, order_by=[entries.c.distance, entries.c.position, entries.c.branch])
+  matches = db.session.query(entries, best.label('best')).subquery()
+  query = db.session.query(model.id, model.name, model.upcoming_shows_count.label('num_upcoming_shows'), db.func.count().over().label('total')).join(matches, model.id == matches.c.id).filter(matches.c.best == 1)
+  rows = query.order_by(matches.c.distance, matches.c.position, matches.c.branch).limit(per_page + 1).offset((page - 1) * per_page).all()
+  if rows:
+    count = rows[0].total
+  else:
+    count = query.count() if page > 1 else 0
+  return {'count': min(count, count_limit), 'count_capped': count > count_limit, 'data': rows[:per_page], 'page': page, 'has_prev': page > 1, 'has_next': len(rows) > per_page}
+
+def show_listing():
+  # shows joined to the names and images of their artist and venue, for /shows and the API
+  return db.session.query(Show.artist_id, Show.venue_id, Show.start_time, Show.end_time, (Artist.name).label('artist_name'), (Artist.image_link).label('image_link'), (Venue.name).label('venue_name')).filter(Show.artist_id == Artist.id).filter(Show.venue_id == Venue.id)
+
+def reconcile_genres(model, owner_id, names):
+  # brings the genre rows of a venue or artist in line with names using one
+  # SELECT, at most one bulk DELETE and at most one multi-row INSERT
+  genre_model, owner = (VenueGenre, VenueGenre.venue_id) if model is Venue else (ArtistGenre, ArtistGenre.artist_id)
+  names = set(names)
+  existing = {name for (name,) in db.session.query(genre_model.name).filter(owner == owner_id)}
+  removed = existing - names
+  added = names - existing
+  if removed:
+    db.session.query(genre_model).filter(owner == owner_id).filter(genre_model.name.in_(removed)).delete(synchronize_session=False)
+  if added:
+    db.session.execute(genre_model.__table__.insert().values([{owner.key: owner_id, 'name': name} for name in sorted(added)]))
+  if removed or added:
+    db.session.query(model).filter(model.id == owner_id).update({model.genre_mask: genre_mask(names)}, synchronize_session=False)
+
+def has_genres(model, names):
+  required = genre_mask(names)
+  return model.genre_mask.op('&')(required) == required
+
+def genre_facets(model, genres=(), state=None):
+  # counts the entities having all of genres, optionally in state, per state and
+  # per genre with one aggregate over the genre masks
+  genre_counts = [db.func.sum(db.case([(model.genre_mask.op('&')(1 << (id - 1)) != 0, 1)], else_=0)) for id in genre_ids.values()]
+  query = db.session.query(model.state, db.func.count(), *genre_counts).filter(has_genres(model, genres)).group_by(model.state).order_by(model.state)
+  if state:
+    query = query.filter(model.state == state)
+  rows = query.all()
+  return {
+    'count': sum(row[1] for row in rows),
+    'states': [{'state': row[0], 'count': row[1]} for row in rows],
+    'genres': [{'id': id, 'name': name, 'count': sum(row[i] or 0 for row in rows)} for i, (name, id) in enumerate(genre_ids.items(), 2)]
+  }
+
+def encode_cursor(values):
+  values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+  return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor, columns):
+  # a cursor whose values do not fit the types of columns answers 400, so that
+  # it never reaches the database
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != len(columns):
+      raise ValueError(cursor)
+    values = [datetime.fromisoformat(value) if isinstance(column.type, db.DateTime) else value for column, value in zip(columns, values)]
+    if not all(isinstance(value, column.type.python_type) and not isinstance(value, bool) for column, value in zip(columns, values)):
+      raise ValueError(cursor)
+    return values
+  except (ValueError, TypeError):
+    abort(400)
+
+def keyset_page(query, columns, after=None, before=None):
+  # pages through query ordered by columns, continuing strictly after or before
+  # the given cursor; every page is an index range scan, however deep
+  per_page = app.config['LISTING_PAGE_SIZE']
+  if before is not None:
+    query = query.filter(db.tuple_(*columns) < db.tuple_(*decode_cursor(before, columns))).order_by(*[column.desc() for column in columns])
+  else:
+    if after is not None:
+      query = query.filter(db.tuple_(*columns) > db.tuple_(*decode_cursor(after, columns)))
+    query = query.order_by(*columns)
+  rows = query.limit(per_page + 1).all()
+  has_more = len(rows) > per_page
+  rows = rows[:per_page]
+  if before is not None:
+    rows.reverse()
+  has_prev = has_more if before is not None else after is not None
+  has_next = before is not None or has_more
+  cursors = {
+    'prev': encode_cursor([getattr(rows[0], column.key) for column in columns]) if rows and has_prev else None,
+    'next': encode_cursor([getattr(rows[-1], column.key) for column in columns]) if rows and has_next else None
+  }
+  return rows, cursors
+
+def aggregate_strings(column, separator):
+  if db.engine.dialect.name == 'postgresql':
+    return db.func.string_agg(column, separator)
+  return db.func.group_concat(column, separator)
+
+def load_detail(model, entity_id, past_limit=None, past_since=None):
+  # loads the entity, its genres and its shows joined to the other side of the
+  # booking in a single SELECT, newest first, so that at most past_limit past
+  # shows are materialized; past_since bounds the shows read, which lets
+  # Postgres skip the partitions of older months; returns the dict expected
+  # by the detail pages
+  if model is Venue:
+    genre_model, genre_owner, show_owner, other, show_other, prefix = VenueGenre, VenueGenre.venue_id, Show.venue_id, Artist, Show.artist_id, 'artist'
+  else:
+    genre_model, genre_owner, show_owner, other, show_other, prefix = ArtistGenre, ArtistGenre.artist_id, Show.artist_id, Venue, Show.venue_id, 'venue'
+  separator = '\x1f'
+  genres = db.session.query(genre_owner.label('owner_id'), aggregate_strings(genre_model.name, separator).label('names')).filter(genre_owner == entity_id).group_by(genre_owner).subquery()
+  shows = show_owner == model.id
+  if past_since is not None:
+    shows = db.and_(shows, Show.start_time >= past_since)
+  query = db.session.query(model, genres.c.names, Show.start_time, other.id, other.name, other.image_link).outerjoin(genres, genres.c.owner_id == model.id).outerjoin(Show, shows).outerjoin(other, other.id == show_other).filter(model.id == entity_id).order_by(Show.start_time.desc())
+  now = datetime.now()
+  data = None
+  past_shows, upcoming_shows = [], []
+  for entity, genre_names, start_time, other_id, other_name, other_image_link in query.yield_per(100):
+    if data is None:
+      data = {col: getattr(entity, col) for col in inspect(model).columns.keys()}
+      data['genres'] = genre_names.split(separator) if genre_names else []
+    if start_time is None:
+      break
+    show = {prefix + '_id': other_id, prefix + '_name': other_name, prefix + '_image_link': other_image_link, 'start_time': start_time}
+    if start_time > now:
+      upcoming_shows.append(show)
+    elif past_limit is None or len(past_shows) < past_limit:
+      past_shows.append(show)
+    else:
+      break
+  if data is None:
+    return None
+  # the stored counts are exact in total; only the split between upcoming and
+  # past lags behind until the next roll-over, so derive past from upcoming
+  total = data['upcoming_shows_count'] + data['past_shows_count']
+  data['upcoming_shows'] = upcoming_shows[::-1]
+  data['upcoming_shows_count'] = len(upcoming_shows)
+  data['past_shows'] = past_shows[::-1]
+  data['past_shows_count'] = total - len(upcoming_shows)
+  return data
+
+def load_detail_page(model, entity_id):
+  # load_detail with the past show limits of the detail pages
+  days = app.config['PAST_SHOWS_WINDOW_DAYS']
+  return load_detail(model, entity_id, past_limit=app.config['PAST_SHOWS_LIMIT'], past_since=datetime.now() - timedelta(days=days) if days else None)
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry denormalized upcoming/past show counts. They are
+# adjusted whenever shows are added or removed, and roll_over_shows() moves
+# shows whose start_time has passed from the upcoming to the past counts.
+# Show.counted_as_past records which of the two counts a show is in.
+
+def count_show(show, now=None):
+  show.counted_as_past = show.start_time <= (now or datetime.now())
+  column = 'past_shows_count' if show.counted_as_past else 'upcoming_shows_count'
+  for model, id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+    db.session.query(model).filter(model.id == id).update({column: getattr(model, column) + 1}, synchronize_session=False)
+
+def uncount_deleted(model, ids):
+  # takes the shows of the venues or artists about to be deleted off the
+  # counts of the other side, with one correlated UPDATE; the shows
+  # themselves go with the ON DELETE CASCADE
+  key, other, other_key = (Show.venue_id, Artist, Show.artist_id) if model is Venue else (Show.artist_id, Venue, Show.venue_id)
+  def removed(counted_as_past):
+    return db.select([db.func.count()]).where(other_key == other.id).where(key.in_(ids)).where(Show.counted_as_past == counted_as_past).as_scalar()
+  db.session.query(other).filter(other.id.in_(db.session.query(other_key).filter(key.in_(ids)))).update({
+    other.upcoming_shows_count: other.upcoming_shows_count - removed(False),
+    other.past_shows_count: other.past_shows_count - removed(True)
+  }, synchronize_session=False)
+
+def roll_over_shows(now=None):
+  now = now or datetime.now()
+  due = (~Show.counted_as_past, Show.start_time <= now)
+  for model, key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+    for id, num_shows in db.session.query(key, db.func.count()).filter(*due).group_by(key).all():
+      db.session.query(model).filter(model.id == id).update({
+        model.upcoming_shows_count: model.upcoming_shows_count - num_shows,
+        model.past_shows_count: model.past_shows_count + num_shows
+      }, synchronize_session=False)
+  return db.session.query(Show).filter(*due).update({Show.counted_as_past: True}, synchronize_session=False)
+
+def count_new_shows(shows, now=None):
+  # counts show rows that are about to be bulk inserted, with one
+  # executemany UPDATE per counter column
+  now = now or datetime.now()
+  deltas = {}
+  for show in shows:
+    show['counted_as_past'] = show['start_time'] <= now
+    column = 'past_shows_count' if show['counted_as_past'] else 'upcoming_shows_count'
+    for model, id in ((Venue, show['venue_id']), (Artist, show['artist_id'])):
+      deltas.setdefault((model, column), Counter())[id] += 1
+  for (model, column), counter in deltas.items():
+    table = model.__table__
+    update = table.update().where(table.c.id == db.bindparam('_id')).values({column: table.c[column] + db.bindparam('_delta')})
+    db.session.execute(update, [{'_id': id, '_delta': delta} for id, delta in counter.items()])
+
+@app.cli.command('roll-over-shows')
+def roll_over_shows_command():
+  """Move shows that have started from the upcoming to the past counts."""
+  num_shows = roll_over_shows()
+  db.session.commit()
+  click.echo('Rolled over {0} shows.'.format(num_shows))
+
+#----------------------------------------------------------------------------#
+# Show listing.
+#----------------------------------------------------------------------------#
+
+# /shows reads ShowListing, which keeps the artist name and image and the
+# venue name next to every show, so that a page is a range scan of one
+# table. Code that adds shows calls list_shows() in the same transaction,
+# edits of names and images go through relist(), and deleted venues and
+# artists take their rows along through ON DELETE CASCADE. `flask
+# refresh-show-listing` rebuilds the table from Show.
+
+def list_shows(shows, artists, venues):
+  # shows are dicts of venue_id, artist_id, start_time and end_time; artists
+  # maps their ids to (name, image_link) and venues to names
+  if shows:
+    db.session.execute(ShowListing.__table__.insert().values([dict(
+      {key: show[key] for key in ('venue_id', 'artist_id', 'start_time', 'end_time')},
+      artist_name=artists[show['artist_id']][0],
+      artist_image_link=artists[show['artist_id']][1],
+      venue_name=venues[show['venue_id']]
+    ) for show in shows]))
+
+def relist(model, entity_id, **values):
+  # copies the edited name (and image) of a venue or artist to its listed shows
+  owner = ShowListing.venue_id if model is Venue else ShowListing.artist_id
+  db.session.query(ShowListing).filter(owner == entity_id).update(values, synchronize_session=False)
+
+def refresh_show_listing():
+  db.session.query(ShowListing).delete(synchronize_session=False)
+  listing = show_listing().with_entities(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time, Artist.name, Artist.image_link, Venue.name)
+  db.session.execute(ShowListing.__table__.insert().from_select([column.name for column in ShowListing.__table__.columns], listing))
+
+@app.cli.command('refresh-show-listing')
+def refresh_show_listing_command():
+  """Rebuild the ShowListing read model from Show."""
+  refresh_show_listing()
+  db.session.commit()
+  click.echo('{0} shows listed.'.format(db.session.query(ShowListing).count()))
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# A venue can host one show at a time. On Postgres the Show_no_double_booking
+# exclusion constraint enforces this and its GiST index answers overlap
+# checks. Other databases fall back to per-venue IntervalIndexes held by this
+# process, built from the venue's shows on first use; they only see bookings
+# made through this process, which is enough for SQLite test runs.
+
+venue_bookings = {}
+
+def load_bookings(venue_ids):
+  # builds the missing interval indexes of venue_ids with one query
+  missing = {id for id in venue_ids if id not in venue_bookings}
+  if missing:
+    intervals = {id: [] for id in missing}
+    for venue_id, start_time, end_time in db.session.query(Show.venue_id, Show.start_time, Show.end_time).filter(Show.venue_id.in_(missing)):
+      intervals[venue_id].append((start_time, end_time))
+    for id, venue_intervals in intervals.items():
+      venue_bookings[id] = IntervalIndex(venue_intervals)
+  return {id: venue_bookings[id] for id in venue_ids}
+
+def forget_bookings(venue_ids):
+  for id in venue_ids:
+    venue_bookings.pop(id, None)
+
+def booking_conflict(venue_id, start_time, end_time):
+  if db.engine.dialect.name == 'postgresql':
+    overlapping = db.func.tsrange(Show.start_time, Show.end_time).op('&&')(db.func.tsrange(start_time, end_time))
+    return db.session.query(db.exists().where(Show.venue_id == venue_id).where(overlapping)).scalar()
+  return load_bookings([venue_id])[venue_id].overlaps(start_time, end_time)
+
+def record_booking(venue_id, start_time, end_time):
+  # called after commit; indexes that are not loaded yet pick the show up when they are
+  if venue_id in venue_bookings:
+    venue_bookings[venue_id].add(start_time, end_time)
+
+def show_end_time(start_time, duration=None):
+  return start_time + timedelta(minutes=duration or app.config['DEFAULT_SHOW_DURATION'])
+
+#----------------------------------------------------------------------------#
+# Matching.
+#----------------------------------------------------------------------------#
+
+# Artists seeking venues are matched to venues, and venues seeking talent to
+# artists, on shared genres within the same state. Each side has a
+# MatchIndex held by this process. It is built with one query on first use
+# and kept current by the create, edit, delete and import code. So that
+# changes made by other processes show up, it is rebuilt in the background
+# once it is MATCH_INDEX_TTL seconds old, while the old one keeps answering.
+
+def seeking_column(model):
+  return Venue.seeking_talent if model is Venue else Artist.seeking_venue
+
+def match_index_builder(model):
+  def build():
+    return MatchIndex(db.session.query(model.id, model.name, model.city, model.state, model.genre_mask).filter(seeking_column(model) == True))
+  return build
+
+match_indexes = {model: RefreshingIndex(app, match_index_builder(model), app.config['MATCH_INDEX_TTL']) for model in (Venue, Artist)}
+
+def match_index(model):
+  return match_indexes[model].get()
+
+def index_match(model, id, name, city, state, mask, seeking):
+  # called after commit; indexes that are not built yet pick the entity up when they are
+  if seeking:
+    match_indexes[model].update(lambda index: index.add(id, name, city, state, mask))
+  else:
+    match_indexes[model].update(lambda index: index.remove(id))
+
+def forget_matches(model, ids):
+  def remove(index):
+    for id in ids:
+      index.remove(id)
+  match_indexes[model].update(remove)
+
+def find_matches(model, entity_id, limit):
+  # the seeking counterparts of a venue or artist, best first; None if it does not exist
+  entity = db.session.query(model.city, model.state, model.genre_mask).filter(model.id == entity_id).first()
+  if entity is None:
+    return None
+  candidates = match_index(Artist if model is Venue else Venue).matches(*entity, limit=limit)
+  return [{'id': id, 'name': name, 'city': city, 'state': entity.state, 'genres': genre_names(shared)} for id, name, city, shared in candidates]
+
+#----------------------------------------------------------------------------#
+# Calendars.
+#----------------------------------------------------------------------------#
+
+# Venue and artist schedules are served as iCalendar feeds. Their validator
+# is the entity's name plus the number and latest times of its shows. One
+# aggregate query reads it, so an unchanged feed is answered with 304 before
+# any show is read. Renaming the other side of a show does not change the
+# validator; the feed catches up with its next show change.
+
+def calendar_validator(model, entity_id):
+  # the feed changes with the entity's name, its shows, and the names and
+  # addresses of the venues or artists on the other side of them
+  owner, other, other_id = (Show.venue_id, Artist, Show.artist_id) if model is Venue else (Show.artist_id, Venue, Show.venue_id)
+  return db.session.query(
+    model.name,
+    model.updated_at,
+    db.func.count(Show.start_time),
+    db.func.max(Show.start_time),
+    db.func.max(Show.end_time),
+    db.func.max(Show.updated_at).label('shows_updated_at'),
+    db.func.max(other.updated_at).label('others_updated_at')
+  ).outerjoin(Show, owner == model.id).outerjoin(other, other_id == other.id).filter(model.id == entity_id).group_by(model.id, model.name, model.updated_at).first()
+
+def calendar_events(model, entity_id):
+  owner = Show.venue_id if model is Venue else Show.artist_id
+  query = db.session.query(Show.venue_id, Show.artist_id, Show.start_time, Show.end_time, Artist.name.label('artist_name'), Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state) \
+    .join(Artist, Show.artist_id == Artist.id).join(Venue, Show.venue_id == Venue.id) \
+    .filter(owner == entity_id).order_by(Show.start_time)
+  stamp = datetime.utcnow()
+  for show in query.yield_per(app.config['API_STREAM_BATCH_SIZE']):
+    yield vevent(
+      '{0}-{1}-{2:%Y%m%dT%H%M%S}@fyyur'.format(show.venue_id, show.artist_id, show.start_time),
+      show.start_time,
+      show.end_time,
+      show.artist_name if model is Venue else '{0} at {1}'.format(show.artist_name, show.venue_name),
+      ', '.join(filter(None, (show.venue_name, show.address, show.city, show.state))),
+      stamp
+    )
+
+def calendar_response(model, entity_id):
+  # streams the events from a server-side cursor, API_STREAM_BATCH_SIZE per chunk
+  validator = calendar_validator(model, entity_id)
+  if validator is None:
+    abort(404)
+  def generate():
+    for chunk in batches(vcalendar(validator.name, calendar_events(model, entity_id)), app.config['API_STREAM_BATCH_SIZE']):
+      yield ''.join(chunk)
+  etag = hashlib.sha1(repr(tuple(validator)).encode()).hexdigest()
+  # updated_at is naive UTC, which is what Werkzeug compares If-Modified-Since with
+  last_modified = max(filter(None, (validator.updated_at, validator.shows_updated_at, validator.others_updated_at)))
+  # Response.make_conditional() would buffer the stream to set Content-Length
+  if is_resource_modified(request.environ, etag, last_modified=last_modified):
+    response = Response(stream_with_context(generate()), mimetype='text/calendar')
+  else:
+    response = Response(status=304)
+  response.set_etag(etag, weak=True)
+  response.last_modified = last_modified
+  return response
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# Venue and artist names are suggested from a PrefixIndex held by this
+# process. It is loaded with one query before the first request when
+# AUTOCOMPLETE_WARM_UP is set, or else on first use. The create, edit,
+# delete and import code keep it current. Names changed through other
+# processes, including `flask import`, show up once the index is rebuilt:
+# in the background when it is AUTOCOMPLETE_INDEX_TTL seconds old, or by
+# POST /autocomplete/reload. Lookups keep being answered meanwhile.
+
+name_kinds = {Venue: 'venue', Artist: 'artist'}
+
+def build_name_index():
+  venues = db.session.query(db.literal('venue').label('kind'), Venue.id, Venue.name)
+  artists = db.session.query(db.literal('artist').label('kind'), Artist.id, Artist.name)
+  return PrefixIndex(venues.union_all(artists).all())
+
+name_index = RefreshingIndex(app, build_name_index, app.config['AUTOCOMPLETE_INDEX_TTL'])
+
+def load_name_index():
+  return len(name_index.refresh())
+
+def index_name(model, id, name):
+  # called after commit; an index that is not loaded yet picks the name up when it is
+  name_index.update(lambda index: index.add(name_kinds[model], id, name))
+
+def forget_names(model, ids):
+  name_index.update(lambda index: index.remove(name_kinds[model], ids))
+
+if app.config['AUTOCOMPLETE_WARM_UP']:
+  @app.before_first_request
+  def warm_name_index():
+    try:
+      load_name_index()
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      app.logger.warning('Autocomplete index not loaded: {0}'.format(e))
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+# On Postgres Show is range partitioned by month of start_time. Exclusion
+# constraints cannot span partitions, so each partition carries its own
+# double-booking constraint; booking_conflict() checks across all of them.
+# Old partitions can be detached, and dropped or archived; the shows in them
+# stay in the past show counts.
+
+show_partition_setup = ['ALTER TABLE "{name}" ADD CONSTRAINT "{name}_no_double_booking" EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)']
+
+# create_all() lays Show out as the migrations do: the default partition,
+# which takes the rows outside of the monthly ones, with its constraint
+event.listen(Show.__table__, 'before_create', db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+event.listen(Show.__table__, 'after_create', db.DDL('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT').execute_if(dialect='postgresql'))
+for statement in show_partition_setup:
+  event.listen(Show.__table__, 'after_create', db.DDL(statement.format(name='Show_default')).execute_if(dialect='postgresql'))
+
+def maintain_show_partitions(ahead, retain=None, archive_schema=None, now=None):
+  # creates the missing partitions from this month to `ahead` months from now
+  # and detaches those that ended more than `retain` months before this month
+  month = month_start(now or datetime.now())
+  connection = db.session.connection()
+  existing = monthly_partitions(connection, Show.__tablename__)
+  created = []
+  for i in range(ahead + 1):
+    if add_months(month, i) not in existing:
+      created.append(create_partition(connection, Show.__tablename__, add_months(month, i), 'start_time', show_partition_setup))
+  detached = []
+  if retain is not None:
+    cutoff = add_months(month, -retain)
+    for partition_month, name in sorted(existing.items()):
+      if add_months(partition_month, 1) <= cutoff:
+        detach_partition(connection, Show.__tablename__, name, archive_schema)
+        db.session.query(ShowListing).filter(ShowListing.start_time >= partition_month, ShowListing.start_time < add_months(partition_month, 1)).delete(synchronize_session=False)
+        detached.append(name)
+  return created, detached
+
+@app.cli.command('show-partitions')
+@click.option('--ahead', default=12, show_default=True, help='Months to create partitions for in advance.')
+@click.option('--retain', type=int, help='Detach partitions that ended more than this many months ago.')
+@click.option('--archive-schema', help='Move detached partitions to this schema instead of dropping them.')
+def show_partitions_command(ahead, retain, archive_schema):
+  """Create upcoming and detach old monthly Show partitions (Postgres)."""
+  if db.engine.dialect.name != 'postgresql':
+    raise click.ClickException('Show is only partitioned on Postgres.')
+  created, detached = maintain_show_partitions(ahead, retain, archive_schema)
+  db.session.commit()
+  for name in created:
+    click.echo('Created {0}'.format(name))
+  for name in detached:
+    click.echo('{0} {1}'.format('Archived' if archive_schema else 'Dropped', name))
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+def validate_row(form_class, row):
+  # runs an imported row through the same form the web handlers use;
+  # returns (form data, None) or (None, errors)
+  formdata = MultiDict()
+  for key, values in row.items():
+    for value in (values if isinstance(values, list) else [values]):
+      if value is True:
+        value = 'y'
+      if value not in (None, False, ''):
+        formdata.add(key, str(value))
+  form = form_class(formdata=formdata, meta={'csrf': False})
+  if not form.validate():
+    return None, form.errors
+  return form.data, None
+
+def insert_returning_ids(table, rows):
+  if db.engine.dialect.name == 'postgresql':
+    return [id for (id,) in db.session.execute(table.insert().values(rows).returning(table.c.id))]
+  return [db.session.execute(table.insert(), row).inserted_primary_key[0] for row in rows]
+
+def import_entities(model, rows):
+  # rows are (line number, form data) pairs; inserts the entities with one
+  # multi-row INSERT on Postgres and all their genres with another
+  genre_model, owner = (VenueGenre, VenueGenre.venue_id) if model is Venue else (ArtistGenre, ArtistGenre.artist_id)
+  columns = [column for column in rows[0][1] if column in model.__table__.columns and column != 'id']
+  ids = insert_returning_ids(model.__table__, [dict({column: data[column] for column in columns}, genre_mask=genre_mask(data['genres'])) for _, data in rows])
+  genres = [{owner.key: id, 'name': name} for id, (_, data) in zip(ids, rows) for name in sorted(set(data['genres']))]
+  if genres:
+    db.session.execute(genre_model.__table__.insert().values(genres))
+  for id, (_, data) in zip(ids, rows):
+    index_match(model, id, data['name'], data['city'], data['state'], genre_mask(data['genres']), data.get(seeking_column(model).key))
+    index_name(model, id, data['name'])
+  return []
+
+def import_shows(rows):
+  # rows are (line number, form data) pairs; resolves the referenced venues
+  # and artists with one query each and inserts the shows with one
+  # multi-row INSERT; returns the rejected (line number, error) pairs
+  rejects, shows = [], []
+  for line_number, data in rows:
+    try:
+      shows.append((line_number, {'venue_id': int(data['venue_id']), 'artist_id': int(data['artist_id']), 'start_time': data['start_time'], 'end_time': show_end_time(data['start_time'], data.get('duration'))}))
+    except (TypeError, ValueError):
+      rejects.append((line_number, 'venue_id and artist_id must be integers'))
+  venues = dict(db.session.query(Venue.id, Venue.name).filter(Venue.id.in_({show['venue_id'] for _, show in shows})))
+  artists = {id: (name, image_link) for id, name, image_link in db.session.query(Artist.id, Artist.name, Artist.image_link).filter(Artist.id.in_({show['artist_id'] for _, show in shows}))}
+  bookings = load_bookings(venues)
+  valid, seen = [], set()
+  for line_number, show in shows:
+    key = (show['venue_id'], show['artist_id'], show['start_time'])
+    if show['venue_id'] not in venues or show['artist_id'] not in artists:
+      rejects.append((line_number, 'unknown venue or artist'))
+    elif key in seen:
+      rejects.append((line_number, 'duplicate show'))
+    elif bookings[show['venue_id']].overlaps(show['start_time'], show['end_time']):
+      rejects.append((line_number, 'venue is already booked at that time'))
+    else:
+      seen.add(key)
+      bookings[show['venue_id']].add(show['start_time'], show['end_time'])
+      valid.append(show)
+  if valid:
+    count_new_shows(valid)
+    db.session.execute(Show.__table__.insert().values(valid))
+    list_shows(valid, artists, venues)
+  return rejects
+
+importers = {
+  'venues': (VenueForm, lambda rows: import_entities(Venue, rows)),
+  'artists': (ArtistForm, lambda rows: import_entities(Artist, rows)),
+  'shows': (ShowForm, import_shows)
+}
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(importers)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per INSERT and transaction.')
+def import_command(kind, path, format, batch_size):
+  """Stream venues, artists or shows from a CSV or JSONL file."""
+  form_class, import_batch = importers[kind]
+  imported = rejected = 0
+  started = time.perf_counter()
+  for batch in batches(read_rows(path, format), batch_size):
+    rows = []
+    for line_number, row in batch:
+      data, errors = validate_row(form_class, row) if row is not None else (None, 'invalid JSON')
+      if errors:
+        rejected += 1
+        click.echo('line {0}: {1}'.format(line_number, errors), err=True)
+      else:
+        rows.append((line_number, data))
+    if not rows:
+      continue
+    try:
+      rejects = import_batch(rows)
+      db.session.commit()
+    except SQLAlchemyError as e:
+      db.session.rollback()
+      venue_bookings.clear()
+      for index in match_indexes.values():
+        index.clear()
+      name_index.clear()
+      rejected += len(rows)
+      click.echo('lines {0}-{1}: batch not imported: {2}'.format(rows[0][0], rows[-1][0], getattr(e, 'orig', e)), err=True)
+      continue
+    for line_number, error in sorted(rejects):
+      click.echo('line {0}: {1}'.format(line_number, error), err=True)
+    rejected += len(rejects)
+    imported += len(rows) - len(rejects)
+    click.echo('{0} {1} imported ({2:.0f} rows/s)'.format(imported, kind, imported / (time.perf_counter() - started)))
+  elapsed = time.perf_counter() - started
+  click.echo('Done: {0} imported, {1} rejected in {2:.1f}s ({3:.0f} rows/s).'.format(imported, rejected, elapsed, imported / elapsed if elapsed else 0))
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+date_formatter = DateTimeFormatter()
+
 def format_datetime(value, format='medium'):
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(value, format)
+  return date_formatter.format(value, format)
+
+def format_datetimes(values, format='medium'):
+  # formats a whole column of datetimes in one call
+  return date_formatter.format_many(values, format)
 
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.filters['datetimes'] = format_datetimes
+
+def warm_templates():
+  # compiles every template, from the bytecode cache where it is current;
+  # returns the number of templates
+  names = app.jinja_env.list_templates(extensions=['html'])
+  for name in names:
+    app.jinja_env.get_template(name)
+  return len(names)
+
+if app.config['TEMPLATE_WARM_UP']:
+  warm_templates()
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+  """Fill the template bytecode cache, e.g. as a deploy step."""
+  click.echo('Compiled {0} templates.'.format(warm_templates()))
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+# The cache lives in this process. Invalidations are not shared between
+# workers, so with several workers a page can be up to PAGE_CACHE_TTL
+# seconds old everywhere but in the worker that handled the write.
+
+page_cache = PageCache(app.config['PAGE_CACHE_MAX_ENTRIES'], ttl=app.config['PAGE_CACHE_TTL'])
+
+def cached_page(entity_arg=None, etag=None):
+  # caches the rendered page per route, entity id and query string; the write
+  # handlers drop the affected entries through invalidate_pages(). etag(entity
+  # id), when given, is computed before the page is rendered: requests whose
+  # If-None-Match holds it get a 304 without the page being loaded, and the
+  # page is cached together with it
+  def decorator(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+      # pending flash messages are rendered into the page, so skip the cache
+      if session.get('_flashes'):
+        return f(*args, **kwargs)
+      key = (request.endpoint, kwargs.get(entity_arg), request.query_string)
+      entry = page_cache.get(key)
+      status = 'HIT'
+      if entry is None:
+        page_etag = etag(kwargs.get(entity_arg)) if etag is not None else None
+        if page_etag is not None and request.if_none_match.contains(page_etag):
+          return not_modified(page_etag)
+        body = f(*args, **kwargs)
+        if not isinstance(body, str):
+          return body
+        entry = (body, page_etag)
+        page_cache.set(key, entry)
+        status = 'MISS'
+      body, page_etag = entry
+      if page_etag is not None and request.if_none_match.contains(page_etag):
+        return not_modified(page_etag)
+      response = make_response(body)
+      response.headers['X-Cache'] = status
+      if page_etag is not None:
+        response.set_etag(page_etag)
+        response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
+
+def not_modified(etag):
+  response = Response(status=304)
+  response.set_etag(etag)
+  response.cache_control.no_cache = True
+  return response
+
+def detail_validator(model, entity_id, now):
+  # one aggregate over the entity, its shows and the venues or artists of
+  # those shows that changes whenever its detail page does: edits bump
+  # updated_at of the entity or of the other side, new shows bump
+  # updated_at of the shows, and the page also changes when the next show
+  # starts or the oldest past one listed leaves PAST_SHOWS_WINDOW_DAYS;
+  # None if the entity does not exist. Only the shows the page lists are
+  # read, as in load_detail(), so Postgres prunes the older partitions;
+  # older shows still count through updated_at of the entity, which
+  # count_show() bumps for every new show
+  owner, other, other_id = (Show.venue_id, Artist, Show.artist_id) if model is Venue else (Show.artist_id, Venue, Show.venue_id)
+  days = app.config['PAST_SHOWS_WINDOW_DAYS']
+  shows = owner == model.id
+  if days:
+    shows = db.and_(shows, Show.start_time >= now - timedelta(days=days))
+  return db.session.query(
+    model.updated_at,
+    db.func.max(Show.updated_at),
+    db.func.max(other.updated_at),
+    db.func.min(db.case([(Show.start_time > now, Show.start_time)])),
+    db.func.min(Show.start_time)
+  ).outerjoin(Show, shows).outerjoin(other, other_id == other.id).filter(model.id == entity_id).group_by(model.id, model.updated_at).first()
+
+def template_digest():
+  # part of every detail ETag, so that pages cached before a deploy that
+  # changed the templates are not reused
+  if not hasattr(template_digest, 'value'):
+    digest = hashlib.sha1()
+    for name in sorted(app.jinja_loader.list_templates()):
+      digest.update(app.jinja_loader.get_source(app.jinja_env, name)[0].encode())
+    template_digest.value = digest.hexdigest()
+  return template_digest.value
+
+def detail_etag(model):
+  # the etag function of cached_page() for the detail pages of model
+  def etag(entity_id):
+    validator = detail_validator(model, entity_id, datetime.now())
+    if validator is None:
+      abort(404)
+    return hashlib.sha1(repr((template_digest(),) + tuple(validator)).encode()).hexdigest()
+  return etag
+
+def invalidate_pages(*pages):
+  # pages are route names or (route, entity id) pairs
+  for page in pages:
+    if isinstance(page, tuple):
+      page_cache.invalidate(*page)
+    else:
+      page_cache.invalidate(page)
+
+def booking_pages(model, *entity_ids):
+  # detail pages of the other side of the entities' shows, which display their names and images
+  if model is Venue:
+    return [('show_artist', artist_id) for (artist_id,) in db.session.query(Show.artist_id).filter(Show.venue_id.in_(entity_ids)).distinct()]
+  return [('show_venue', venue_id) for (venue_id,) in db.session.query(Show.venue_id).filter(Show.artist_id.in_(entity_ids)).distinct()]
+
+def delete_entities(model, ids):
+  # deletes venues or artists with one DELETE and commits; their genres and
+  # shows are removed by the database through the ON DELETE CASCADE foreign
+  # keys; returns the number deleted
+  pages = booking_pages(model, *ids)
+  uncount_deleted(model, ids)
+  deleted = db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+  db.session.commit()
+  forget_matches(model, ids)
+  forget_names(model, ids)
+  if model is Venue:
+    forget_bookings(ids)
+    invalidate_pages('venues', 'shows', *pages, *[('show_venue', id) for id in ids])
+  else:
+    forget_bookings([venue_id for _, venue_id in pages])
+    invalidate_pages('artists', 'shows', *pages, *[('show_artist', id) for id in ids])
+  return deleted
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -104,39 +1035,41 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@query_budget(1)
+@cached_page()
 def venues():
-  data = []
-  for (city, state) in db.session.query(Venue.city, Venue.state).distinct().all():
-    area = {}
-    area['city'] = city
-    area['state'] = state
-    area['venues'] = []
-    for area_venue in db.session.query(Venue).filter(Venue.city == city).filter(Venue.state == state).all():
-      venue = {}
-      venue['id'] = area_venue.id
-      venue['name'] = area_venue.name
-      venue['num_upcoming_shows'] = db.session.query(Show).filter(Show.venue_id == area_venue.id).filter(Show.start_time > datetime.now()).count()
-      area['venues'].append(venue)
-    data.append(area)
-  return render_template('pages/venues.html', areas=data)  
+  return render_template('pages/venues.html', areas=venue_areas())
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
+@query_budget(2)
 def search_venues():
-  query = db.session.query(Venue.id, Venue.name).filter(Venue.name.ilike('%{0}%'.format(request.form.get('search_term'))))
-  response = {'count': query.count(), 'data': query.all()}
+  response = search(Venue, VenueGenre, request.form.get('search_term', ''), page=request.form.get('page', 1, type=int))
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@query_budget(2)
+@cached_page('venue_id', etag=detail_etag(Venue))
 def show_venue(venue_id):
-  venue = Venue.query.get(venue_id)
-  data = {col: getattr(venue, col) for col in inspect(Venue).columns.keys()}
-  data['genres'] = [genre.name for genre in db.session.query(VenueGenre).filter(VenueGenre.venue_id==venue_id).all()]
-  data['past_shows'] = db.session.query(Show.artist_id, Show.start_time, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')).filter(Show.artist_id==Artist.id).filter(Show.venue_id==venue.id).filter(Show.start_time < datetime.now()).order_by(Show.start_time).all()
-  data['past_shows_count'] = len(data['past_shows'])
-  data['upcoming_shows'] = db.session.query(Show.artist_id, Show.start_time, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')).filter(Show.artist_id==Artist.id).filter(Show.venue_id==venue.id).filter(Show.start_time > datetime.now()).order_by(Show.start_time).all()
-  data['upcoming_shows_count'] = len(data['upcoming_shows'])
+  data = load_detail_page(Venue, venue_id)
+  if data is None:
+    abort(404)
   return render_template('pages/show_venue.html', venue=data)
 
+@app.route('/venues/<int:venue_id>/matches')
+@query_budget(2)
+def venue_matches(venue_id):
+  # seeking artists, ranked by shared genres; limit defaults to MATCHES_LIMIT
+  matches = find_matches(Venue, venue_id, request.args.get('limit', app.config['MATCHES_LIMIT'], type=int))
+  if matches is None:
+    abort(404)
+  return jsonify(matches)
+
+@app.route('/venues/<int:venue_id>/calendar.ics')
+@query_budget(1)
+def venue_calendar(venue_id):
+  return calendar_response(Venue, venue_id)
+
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   venue = Venue.query.get(venue_id)
@@ -150,12 +1083,10 @@ def edit_venue_submission(venue_id):
   body = {}
   try:
     venue = Venue.query.get(venue_id)
+    listed = (venue.name, venue.image_link)
     venue.name = request.form.get('name')
 
-    db.session.query(VenueGenre).filter(VenueGenre.venue_id == venue_id).filter(~VenueGenre.name.in_(request.form.getlist('genres'))).delete(synchronize_session=False)
-    for genre in request.form.getlist('genres'):
-      if db.session.query(VenueGenre).filter(VenueGenre.venue_id == venue_id).filter(VenueGenre.name == genre).count() < 1:
-        venue.genres.append(VenueGenre(name=genre))
+    reconcile_genres(Venue, venue_id, request.form.getlist('genres'))
 
     venue.city = request.form.get('city')
     venue.state = request.form.get('state')
@@ -167,7 +1098,13 @@ def edit_venue_submission(venue_id):
     venue.seeking_description = request.form.get('seeking_description')
     venue.image_link = request.form.get('image_link')
 
+    if (venue.name, venue.image_link) != listed:
+      relist(Venue, venue_id, venue_name=venue.name)
+    pages = booking_pages(Venue, venue_id)
     db.session.commit()
+    index_match(Venue, venue_id, venue.name, venue.city, venue.state, genre_mask(request.form.getlist('genres')), venue.seeking_talent)
+    index_name(Venue, venue_id, venue.name)
+    invalidate_pages('venues', 'shows', ('show_venue', venue_id), *pages)
     body['name'] = venue.name
   except:
     error = True
@@ -192,7 +1129,6 @@ def create_venue_submission():
   try:
     venue = Venue(
       name=request.form.get('name'),
-      genres=[VenueGenre(name=genre) for genre in request.form.getlist('genres')],
       city=request.form.get('city'),
       state=request.form.get('state'),
       address=request.form.get('address'),
@@ -204,7 +1140,12 @@ def create_venue_submission():
       image_link=request.form.get('image_link')
     )
     db.session.add(venue) 
+    db.session.flush()
+    reconcile_genres(Venue, venue.id, request.form.getlist('genres'))
     db.session.commit()
+    index_match(Venue, venue.id, venue.name, venue.city, venue.state, genre_mask(request.form.getlist('genres')), venue.seeking_talent)
+    index_name(Venue, venue.id, venue.name)
+    invalidate_pages('venues')
   except:
     error = True
     db.session.rollback()
@@ -219,10 +1160,9 @@ def create_venue_submission():
 @app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   error = False
+  deleted = 0
   try:
-    venue = Venue.query.get(venue_id)
-    db.session.delete(venue)
-    db.session.commit()
+    deleted = delete_entities(Venue, [venue_id])
   except:
     error = True
     db.session.rollback()
@@ -230,33 +1170,68 @@ def delete_venue(venue_id):
     db.session.close()
   if error:
       abort (400)
-  else: 
-    return jsonify({'success': True})
+  if not deleted:
+    abort(404)
+  return jsonify({'success': True})
+
+@app.route('/venues', methods=['DELETE'])
+def delete_venues():
+  # bulk delete; the body is {"ids": [...]}
+  ids = (request.get_json(silent=True) or {}).get('ids')
+  if not isinstance(ids, list) or not ids or not all(isinstance(id, int) for id in ids):
+    abort(400)
+  error = False
+  try:
+    deleted = delete_entities(Venue, ids)
+  except:
+    error = True
+    db.session.rollback()
+  finally:
+    db.session.close()
+  if error:
+    abort(400)
+  return jsonify({'success': True, 'deleted': deleted})
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@query_budget(1)
+@cached_page()
 def artists():
-  data = db.session.query(Artist.id, Artist.name).order_by(Artist.name).all()
-  return render_template('pages/artists.html', artists=data)
+  query = db.session.query(Artist.id, Artist.name)
+  data, cursors = keyset_page(query, (Artist.name, Artist.id), after=request.args.get('after'), before=request.args.get('before'))
+  return render_template('pages/artists.html', artists=data, cursors=cursors)
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
+@query_budget(2)
 def search_artists():
-  query = db.session.query(Artist.id, Artist.name).filter(Artist.name.ilike('%{0}%'.format(request.form.get('search_term'))))
-  response = {'count': query.count(), 'data': query.all()}
+  response = search(Artist, ArtistGenre, request.form.get('search_term', ''), page=request.form.get('page', 1, type=int))
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/artists/<int:artist_id>')
+@query_budget(2)
+@cached_page('artist_id', etag=detail_etag(Artist))
 def show_artist(artist_id):
-  artist = Artist.query.get(artist_id)
-  data = {col: getattr(artist, col) for col in inspect(Artist).columns.keys()}
-  data['genres'] = [genre.name for genre in artist.genres]
-  data['past_shows'] = db.session.query(Show.venue_id, Show.start_time, Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link')).filter(Show.artist_id == artist_id).filter(Show.venue_id == Venue.id).filter(Show.start_time < datetime.now()).order_by(Show.start_time).all()
-  data['past_shows_count'] = len(data['past_shows'])
-  data['upcoming_shows'] = db.session.query(Show.venue_id, Show.start_time, Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link')).filter(Show.artist_id == artist_id).filter(Show.venue_id==Venue.id).filter(Show.start_time > datetime.now()).order_by(Show.start_time).all()
-  data['upcoming_shows_count'] = len(data['upcoming_shows'])
+  data = load_detail_page(Artist, artist_id)
+  if data is None:
+    abort(404)
   return render_template('pages/show_artist.html', artist=data)
 
+@app.route('/artists/<int:artist_id>/matches')
+@query_budget(2)
+def artist_matches(artist_id):
+  # seeking venues, ranked by shared genres; limit defaults to MATCHES_LIMIT
+  matches = find_matches(Artist, artist_id, request.args.get('limit', app.config['MATCHES_LIMIT'], type=int))
+  if matches is None:
+    abort(404)
+  return jsonify(matches)
+
+@app.route('/artists/<int:artist_id>/calendar.ics')
+@query_budget(1)
+def artist_calendar(artist_id):
+  return calendar_response(Artist, artist_id)
+
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   artist = Artist.query.get(artist_id)
@@ -270,12 +1245,10 @@ def edit_artist_submission(artist_id):
   body = {}
   try:
     artist = Artist.query.get(artist_id)
+    listed = (artist.name, artist.image_link)
     artist.name = request.form.get('name')
 
-    db.session.query(ArtistGenre).filter(ArtistGenre.artist_id == artist_id).filter(~ArtistGenre.name.in_(request.form.getlist('genres'))).delete(synchronize_session=False)
-    for genre in request.form.getlist('genres'):
-      if db.session.query(ArtistGenre).filter(ArtistGenre.artist_id == artist_id).filter(ArtistGenre.name == genre).count() < 1:
-        artist.genres.append(ArtistGenre(name=genre))
+    reconcile_genres(Artist, artist_id, request.form.getlist('genres'))
 
     artist.city = request.form.get('city')
     artist.state = request.form.get('state')
@@ -286,7 +1259,13 @@ def edit_artist_submission(artist_id):
     artist.seeking_description = request.form.get('seeking_description')
     artist.image_link = request.form.get('image_link')
 
+    if (artist.name, artist.image_link) != listed:
+      relist(Artist, artist_id, artist_name=artist.name, artist_image_link=artist.image_link)
+    pages = booking_pages(Artist, artist_id)
     db.session.commit()
+    index_match(Artist, artist_id, artist.name, artist.city, artist.state, genre_mask(request.form.getlist('genres')), artist.seeking_venue)
+    index_name(Artist, artist_id, artist.name)
+    invalidate_pages('artists', 'shows', ('show_artist', artist_id), *pages)
     body['name'] = artist.name
   except:
     error = True
@@ -311,7 +1290,6 @@ def create_artist_submission():
   try:
     artist = Artist(
       name=request.form.get('name'),
-      genres=[ArtistGenre(name=genre) for genre in request.form.getlist('genres')],
       city=request.form.get('city'),
       state=request.form.get('state'),
       phone=request.form.get('phone'),
@@ -322,7 +1300,12 @@ def create_artist_submission():
       image_link=request.form.get('image_link')
     )
     db.session.add(artist) 
+    db.session.flush()
+    reconcile_genres(Artist, artist.id, request.form.getlist('genres'))
     db.session.commit()
+    index_match(Artist, artist.id, artist.name, artist.city, artist.state, genre_mask(request.form.getlist('genres')), artist.seeking_venue)
+    index_name(Artist, artist.id, artist.name)
+    invalidate_pages('artists')
   except:
     error = True
     db.session.rollback()
@@ -337,10 +1320,9 @@ def create_artist_submission():
 @app.route('/artists/<int:artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
   error = False
+  deleted = 0
   try:
-    artist = Artist.query.get(artist_id)
-    db.session.delete(artist)
-    db.session.commit()
+    deleted = delete_entities(Artist, [artist_id])
   except:
     error = True
     db.session.rollback()
@@ -348,16 +1330,38 @@ def delete_artist(artist_id):
     db.session.close()
   if error:
       abort (400)
-  else: 
-    return jsonify({'success': True})
+  if not deleted:
+    abort(404)
+  return jsonify({'success': True})
+
+@app.route('/artists', methods=['DELETE'])
+def delete_artists():
+  # bulk delete; the body is {"ids": [...]}
+  ids = (request.get_json(silent=True) or {}).get('ids')
+  if not isinstance(ids, list) or not ids or not all(isinstance(id, int) for id in ids):
+    abort(400)
+  error = False
+  try:
+    deleted = delete_entities(Artist, ids)
+  except:
+    error = True
+    db.session.rollback()
+  finally:
+    db.session.close()
+  if error:
+    abort(400)
+  return jsonify({'success': True, 'deleted': deleted})
 
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@query_budget(1)
+@cached_page()
 def shows():
-  data = db.session.query(Show.artist_id, Show.venue_id, Show.start_time, (Artist.name).label('artist_name'), (Artist.image_link).label('image_link'), (Venue.name).label('venue_name')).filter(Show.artist_id == Artist.id).filter(Show.venue_id == Venue.id).order_by(Show.start_time).all()
-  return render_template('pages/shows.html', shows=data)
+  query = db.session.query(ShowListing.artist_id, ShowListing.venue_id, ShowListing.start_time, ShowListing.artist_name, ShowListing.artist_image_link.label('image_link'), ShowListing.venue_name)
+  data, cursors = keyset_page(query, (ShowListing.start_time, ShowListing.venue_id, ShowListing.artist_id), after=request.args.get('after'), before=request.args.get('before'))
+  return render_template('pages/shows.html', shows=data, cursors=cursors)
 
 @app.route('/shows/create')
 def create_shows():
@@ -367,14 +1371,27 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   error = False
+  booked = False
+  duration = request.form.get('duration', type=int)
+  if request.form.get('duration') and (duration is None or duration < 1):
+    flash('The duration must be a whole number of minutes. Show could not be listed.')
+    return render_template('pages/home.html')
   try:
     artist = Artist.query.get(request.form.get('artist_id'))
     venue = Venue.query.get(request.form.get('venue_id'))
-    show = Show(start_time=request.form.get('start_time'))
-    show.artist = artist
-    show.venue = venue
-    db.session.add(show)
-    db.session.commit()
+    start_time = parse_datetime(request.form.get('start_time'))
+    end_time = show_end_time(start_time, duration)
+    booked = booking_conflict(venue.id, start_time, end_time)
+    if not booked:
+      show = Show(artist_id=artist.id, venue_id=venue.id, start_time=start_time, end_time=end_time)
+      db.session.add(show)
+      count_show(show)
+      list_shows([{'venue_id': venue.id, 'artist_id': artist.id, 'start_time': start_time, 'end_time': end_time}], {artist.id: (artist.name, artist.image_link)}, {venue.id: venue.name})
+      venue_id = venue.id
+      pages = [('show_venue', venue.id), ('show_artist', artist.id)]
+      db.session.commit()
+      record_booking(venue_id, start_time, end_time)
+      invalidate_pages('venues', 'shows', *pages)
   except:
     error = True
     db.session.rollback()
@@ -382,29 +1399,196 @@ def create_show_submission():
     db.session.close()
   if error:
     flash('An error occurred. Show could not be listed.')
+  elif booked:
+    flash('The venue is already booked at that time. Show could not be listed.')
   else:
     flash('Show was successfully listed!')
   return render_template('pages/home.html')
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete')
+@query_budget(1)
+def autocomplete():
+  # ?q=<prefix>, optionally &type=venue or &type=artist and &limit=<n>; the
+  # database is only queried to load the index on first use, and rebuilds
+  # run in the background
+  kind = request.args.get('type')
+  if kind not in (None, 'venue', 'artist'):
+    abort(400)
+  term = request.args.get('q', '')
+  limit = min(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int), app.config['AUTOCOMPLETE_MAX_LIMIT'])
+  suggestions = name_index.get().lookup(term, kind, limit) if term.strip() else []
+  return jsonify([{'type': suggestion_kind, 'id': id, 'name': name, 'url': url_for('show_' + suggestion_kind, **{suggestion_kind + '_id': id})} for suggestion_kind, id, name in suggestions])
+
+@app.route('/autocomplete/reload', methods=['POST'])
+def reload_autocomplete():
+  # reloads the index of this process only
+  return jsonify({'success': True, 'names': load_name_index()})
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@app.route('/metrics')
+def metrics():
+  return jsonify(dict(instrumentation.stats(), page_cache=page_cache.stats()))
+
+#  API
+#  ----------------------------------------------------------------
+
+# Read-only JSON versions of the pages above, built on the same queries.
+# Collections are streamed from a server-side cursor as a JSON array, or as
+# NDJSON when the client asks for application/x-ndjson.
+
+def to_json(value):
+  return json.dumps(value, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+def stream_json(query, serialize):
+  # serializes query's rows while the response is sent, one fetch batch per chunk
+  batch_size = app.config['API_STREAM_BATCH_SIZE']
+  ndjson = request.args.get('format') == 'ndjson' or request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+  def generate():
+    rows = (to_json(serialize(row)) for row in query.yield_per(batch_size))
+    if ndjson:
+      for chunk in batches(rows, batch_size):
+        yield '\n'.join(chunk) + '\n'
+    else:
+      separator = '['
+      for chunk in batches(rows, batch_size):
+        yield separator + ','.join(chunk)
+        separator = ','
+      yield ']' if separator == ',' else '[]'
+  return Response(stream_with_context(generate()), mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+def json_response(data, status=200):
+  return Response(to_json(data), status=status, mimetype='application/json')
+
+def facet_args():
+  # the genre (repeatable) and state filters of the collection and facet endpoints
+  genres = request.args.getlist('genre')
+  if any(name not in genre_ids for name in genres):
+    abort(400, 'Unknown genre')
+  return genres, request.args.get('state')
+
+def entity_listing(model):
+  genres, state = facet_args()
+  query = db.session.query(model.id, model.name, model.city, model.state, model.upcoming_shows_count).filter(has_genres(model, genres))
+  if state:
+    query = query.filter(model.state == state)
+  return stream_json(query.order_by(model.id), lambda row: row._asdict())
+
+@app.route('/api/v1/venues')
+def api_venues():
+  return entity_listing(Venue)
+
+@app.route('/api/v1/artists')
+def api_artists():
+  return entity_listing(Artist)
+
+@app.route('/api/v1/venues/facets')
+@query_budget(1)
+def api_venue_facets():
+  genres, state = facet_args()
+  return json_response(genre_facets(Venue, genres, state))
+
+@app.route('/api/v1/artists/facets')
+@query_budget(1)
+def api_artist_facets():
+  genres, state = facet_args()
+  return json_response(genre_facets(Artist, genres, state))
+
+@app.route('/api/v1/shows')
+def api_shows():
+  query = show_listing()
+  for key in ('venue_id', 'artist_id'):
+    if key in request.args:
+      query = query.filter(getattr(Show, key) == request.args.get(key, type=int))
+  return stream_json(query.order_by(Show.start_time, Show.venue_id, Show.artist_id), lambda row: row._asdict())
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@query_budget(1)
+def api_venue(venue_id):
+  data = load_detail_page(Venue, venue_id)
+  if data is None:
+    abort(404)
+  return json_response(data)
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@query_budget(1)
+def api_artist(artist_id):
+  data = load_detail_page(Artist, artist_id)
+  if data is None:
+    abort(404)
+  return json_response(data)
+
+@app.route('/api/v1/venues/search')
+@query_budget(2)
+def api_search_venues():
+  results = search(Venue, VenueGenre, request.args.get('search_term', ''), page=request.args.get('page', 1, type=int))
+  results['data'] = [{'id': row.id, 'name': row.name, 'num_upcoming_shows': row.num_upcoming_shows} for row in results['data']]
+  return json_response(results)
+
+@app.route('/api/v1/artists/search')
+@query_budget(2)
+def api_search_artists():
+  results = search(Artist, ArtistGenre, request.args.get('search_term', ''), page=request.args.get('page', 1, type=int))
+  results['data'] = [{'id': row.id, 'name': row.name, 'num_upcoming_shows': row.num_upcoming_shows} for row in results['data']]
+  return json_response(results)
+
 #  Errors
 #  ----------------------------------------------------------------
 
+def api_error(error, status):
+  return json_response({'success': False, 'error': status, 'message': getattr(error, 'description', 'Internal server error')}, status)
+
+@app.errorhandler(400)
+def bad_request_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(error, 400)
+    return error
+
 @app.errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(error, 404)
     return render_template('errors/404.html'), 404
 
 @app.errorhandler(500)
 def server_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(error, 500)
     return render_template('errors/500.html'), 500
 
+request_logger = logging.getLogger('fyyur.requests')
+request_logger.propagate = False
+request_timer = RequestTimer(app, request_logger)
+
 if not app.debug:
-    file_handler = FileHandler('error.log')
+    # request threads only put records on a queue; a listener thread formats
+    # them and writes them in batches, rotating the files by size
+    log_queue = queue.Queue(app.config['LOG_QUEUE_SIZE'])
+    file_handler = BatchingRotatingFileHandler(
+        app.config['LOG_FILE'], maxBytes=app.config['LOG_MAX_BYTES'], backupCount=app.config['LOG_BACKUP_COUNT'], delay=True
+    )
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
     )
-    app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    request_handler = BatchingRotatingFileHandler(
+        app.config['REQUEST_LOG_FILE'], maxBytes=app.config['LOG_MAX_BYTES'], backupCount=app.config['LOG_BACKUP_COUNT'], delay=True
+    )
+    request_handler.setFormatter(Formatter('%(message)s'))
+    request_handler.addFilter(logging.Filter(request_logger.name))
+    file_handler.addFilter(lambda record: record.name != request_logger.name)
+    queue_handler = DroppingQueueHandler(log_queue)
+    log_listener = BatchingListener(log_queue, [file_handler, request_handler], batch_size=app.config['LOG_BATCH_SIZE'])
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    app.logger.setLevel(logging.INFO)
+    app.logger.addHandler(queue_handler)
+    request_logger.setLevel(logging.INFO)
+    request_logger.addHandler(queue_handler)
     app.logger.info('errors')
 
 #----------------------------------------------------------------------------#
@@ -0,0 +1,141 @@
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from flask import g, request
+from flask.signals import before_render_template, signals_available, template_rendered
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that writes a batch of records with one write call."""
+
+    def emit_batch(self, records):
+        records = [record for record in records if record.levelno >= self.level and self.filter(record)]
+        if not records:
+            return
+        try:
+            text = ''.join(self.format(record) + self.terminator for record in records)
+            self.acquire()
+            try:
+                if self.stream is None:
+                    self.stream = self._open()
+                if self.maxBytes > 0 and self.stream.tell() + len(text) > self.maxBytes and self.stream.tell() > 0:
+                    self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                self.stream.write(text)
+                self.stream.flush()
+            finally:
+                self.release()
+        except Exception:
+            self.handleError(records[-1])
+
+
+class BatchingListener:
+    """Background thread that drains a log queue into batching handlers.
+
+    It waits up to flush_interval seconds for a record, then takes whatever
+    else is queued, up to batch_size records, and hands the batch to every
+    handler. Formatting, writing and rotation all happen on this thread.
+    """
+
+    _stop = object()
+
+    def __init__(self, queue, handlers, batch_size=256, flush_interval=1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(self._stop)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._stop in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._stop]
+            for handler in self.handlers:
+                handler.emit_batch(batch)
+
+
+class RequestTimer:
+    """Logs one JSON record per request with its route, status and timings.
+
+    DB time comes from the query stats the instrumentation keeps on g and
+    render time from Flask's template signals, when blinker is installed.
+    Nothing is recorded unless the logger is enabled for INFO.
+    """
+
+    def __init__(self, app, logger):
+        self.logger = logger
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if signals_available:
+            before_render_template.connect(self._before_render, app)
+            template_rendered.connect(self._after_render, app)
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.render_time = 0.0
+
+    def _before_render(self, sender, template, context, **extra):
+        # templates rendered outside of a request are not timed
+        if 'request_started' in g:
+            g.render_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        if 'render_started' in g:
+            g.render_time += time.perf_counter() - g.pop('render_started')
+
+    def _after_request(self, response):
+        if 'request_started' not in g or not self.logger.isEnabledFor(logging.INFO):
+            return response
+        stats = g.get('query_stats')
+        self.logger.info(json.dumps({
+            'time': time.time(),
+            'method': request.method,
+            'route': request.endpoint,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 3),
+            'queries': stats.queries if stats is not None else None,
+            'db_ms': round(stats.db_time * 1000, 3) if stats is not None else None,
+            'render_ms': round(g.render_time * 1000, 3) if signals_available else None
+        }))
+        return response
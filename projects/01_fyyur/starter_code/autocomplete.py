@@ -0,0 +1,130 @@
+import heapq
+from bisect import bisect_left, insort
+from collections import namedtuple
+from threading import Lock
+
+
+def normalize(value):
+    return ' '.join(value.lower().split())
+
+
+def name_keys(name):
+    # the name from each of its words on, so "The Musical Hop" is found by "mus" too
+    words = normalize(name).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+# keys and names hold what load() read; delta and delta_names what was added
+# since, and removed the entries of keys and names that no longer count
+_Snapshot = namedtuple('_Snapshot', ['keys', 'names', 'delta', 'delta_names', 'removed'])
+
+
+class PrefixIndex:
+    """Sorted arrays of name keys answering prefix lookups with bisect.
+
+    Entries are (kind, id, name) triples, e.g. ('venue', 1, 'The Musical
+    Hop'), with one array per kind. Lookups read an immutable snapshot
+    without locking. load() builds the main arrays; add() and remove() only
+    copy a small sorted delta and a set of tombstones for main entries that
+    were renamed or removed, which lookups merge in. Once the delta holds
+    more than max_delta entries it is folded into the main arrays, as it is
+    on every load().
+    """
+
+    def __init__(self, entries=None, max_delta=1024):
+        self._lock = Lock()
+        self._snapshot = _Snapshot({}, {}, {}, {}, frozenset())
+        self.max_delta = max_delta
+        self.loaded = False
+        if entries is not None:
+            self.load(entries)
+
+    def __len__(self):
+        snapshot = self._snapshot
+        return len(snapshot.names) - len(snapshot.removed) + len(snapshot.delta_names)
+
+    def load(self, entries):
+        names = {(kind, id): name for kind, id, name in entries}
+        keys = {}
+        for (kind, id), name in names.items():
+            keys.setdefault(kind, []).extend((key, id) for key in name_keys(name))
+        with self._lock:
+            self._snapshot = _Snapshot({kind: tuple(sorted(kind_keys)) for kind, kind_keys in keys.items()}, names, {}, {}, frozenset())
+            self.loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = _Snapshot({}, {}, {}, {}, frozenset())
+            self.loaded = False
+
+    def add(self, kind, id, name):
+        # adds or renames an entry
+        with self._lock:
+            snapshot = self._snapshot
+            kind_delta = self._without(list(snapshot.delta.get(kind, ())), snapshot.delta_names, kind, [id])
+            for key in name_keys(name):
+                insort(kind_delta, (key, id))
+            removed = snapshot.removed | {(kind, id)} if (kind, id) in snapshot.names else snapshot.removed
+            self._swap(snapshot._replace(delta={**snapshot.delta, kind: tuple(kind_delta)}, delta_names={**snapshot.delta_names, (kind, id): name}, removed=removed))
+
+    def remove(self, kind, ids):
+        with self._lock:
+            snapshot = self._snapshot
+            kind_delta = self._without(list(snapshot.delta.get(kind, ())), snapshot.delta_names, kind, ids)
+            entries = {(kind, id) for id in ids}
+            self._swap(snapshot._replace(
+                delta={**snapshot.delta, kind: tuple(kind_delta)},
+                delta_names={entry: name for entry, name in snapshot.delta_names.items() if entry not in entries},
+                removed=snapshot.removed | {entry for entry in entries if entry in snapshot.names}
+            ))
+
+    def lookup(self, prefix, kind=None, limit=10):
+        """Returns up to limit (kind, id, name) triples, ordered by matching key, whose names have a word starting with prefix."""
+        snapshot = self._snapshot
+        prefix = normalize(prefix)
+        matches = [self._matches(kind_keys, prefix, limit, kind_name, snapshot.removed) for kind_name, kind_keys in snapshot.keys.items() if kind in (None, kind_name)]
+        matches.extend(self._matches(kind_keys, prefix, limit, kind_name, ()) for kind_name, kind_keys in snapshot.delta.items() if kind in (None, kind_name))
+        results, seen = [], set()
+        for key, kind_name, id in heapq.merge(*matches):
+            if (kind_name, id) not in seen:
+                seen.add((kind_name, id))
+                results.append((kind_name, id, snapshot.delta_names[(kind_name, id)] if (kind_name, id) in snapshot.delta_names else snapshot.names[(kind_name, id)]))
+                if len(results) == limit:
+                    break
+        return results
+
+    def _matches(self, kind_keys, prefix, limit, kind, removed):
+        # yields the keys starting with prefix in order, skipping removed
+        # entries and stopping after limit distinct ids
+        seen = set()
+        i = bisect_left(kind_keys, (prefix,))
+        while i < len(kind_keys) and len(seen) < limit and kind_keys[i][0].startswith(prefix):
+            if (kind, kind_keys[i][1]) not in removed:
+                seen.add(kind_keys[i][1])
+                yield kind_keys[i][0], kind, kind_keys[i][1]
+            i += 1
+
+    def _without(self, kind_keys, names, kind, ids):
+        # deletes the keys of the given ids in place, finding each with bisect
+        for id in ids:
+            if (kind, id) in names:
+                for key in name_keys(names[(kind, id)]):
+                    del kind_keys[bisect_left(kind_keys, (key, id))]
+        return kind_keys
+
+    def _swap(self, snapshot):
+        # called with the lock held; folding copies the main arrays once per
+        # max_delta changes
+        if len(snapshot.delta_names) + len(snapshot.removed) > self.max_delta:
+            snapshot = self._folded(snapshot)
+        self._snapshot = snapshot
+
+    def _folded(self, snapshot):
+        keys = {}
+        for kind in set(snapshot.keys) | set(snapshot.delta):
+            kept = (item for item in snapshot.keys.get(kind, ()) if (kind, item[1]) not in snapshot.removed)
+            keys[kind] = tuple(heapq.merge(kept, snapshot.delta.get(kind, ())))
+        names = {entry: name for entry, name in snapshot.names.items() if entry not in snapshot.removed}
+        names.update(snapshot.delta_names)
+        return _Snapshot(keys, names, {}, {}, frozenset())
+
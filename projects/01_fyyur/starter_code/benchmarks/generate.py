@@ -0,0 +1,180 @@
+"""Generates deterministic synthetic venues, artists and shows.
+
+Venues and artists are spread over the states in proportion to their number
+of area codes (a rough proxy for population), get phone numbers from those
+area codes and one to three genres drawn from a skewed popularity
+distribution. Show counts per venue and bookings per artist are long-tailed.
+Venues never have two shows on the same day, so the data passes the
+double-booking check as long as shows are generated into a database without
+shows. The ShowListing read model is rebuilt after the shows are inserted.
+The same arguments always produce the same rows; ids continue after
+the current maximum. Run from the project directory, e.g.
+
+  $ python benchmarks/generate.py --database-url postgresql://localhost:5432/fyyur_bench --venues 1000000 --artists 1000000 --shows 10000000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Venue, VenueGenre, Artist, ArtistGenre, Show, ShowListing, count_new_shows, genre_mask, refresh_show_listing
+from forms import area_codes, genre_choices
+
+words = ['Blue', 'Red', 'Golden', 'Silver', 'Electric', 'Velvet', 'Midnight', 'Crystal', 'Iron', 'Wild',
+         'Moon', 'Sun', 'River', 'Tiger', 'Garden', 'Palace', 'Lounge', 'Club', 'Hall', 'Tavern',
+         'Owls', 'Wolves', 'Roses', 'Kings', 'Queens', 'Saints', 'Riders', 'Echoes', 'Dreams', 'Sparks']
+cities = {
+  'AL': ['Birmingham', 'Montgomery'], 'AK': ['Anchorage', 'Juneau'], 'AZ': ['Phoenix', 'Tucson'], 'AR': ['Little Rock', 'Fayetteville'],
+  'CA': ['Los Angeles', 'San Francisco', 'San Diego', 'Oakland'], 'CO': ['Denver', 'Boulder'], 'CT': ['Hartford', 'New Haven'],
+  'DE': ['Wilmington', 'Dover'], 'DC': ['Washington'], 'FL': ['Miami', 'Orlando', 'Tampa'], 'GA': ['Atlanta', 'Savannah'],
+  'HI': ['Honolulu', 'Hilo'], 'ID': ['Boise', 'Idaho Falls'], 'IL': ['Chicago', 'Springfield'], 'IN': ['Indianapolis', 'Bloomington'],
+  'IA': ['Des Moines', 'Iowa City'], 'KS': ['Wichita', 'Lawrence'], 'KY': ['Louisville', 'Lexington'], 'LA': ['New Orleans', 'Baton Rouge'],
+  'ME': ['Portland', 'Bangor'], 'MD': ['Baltimore', 'Annapolis'], 'MA': ['Boston', 'Cambridge'], 'MI': ['Detroit', 'Ann Arbor'],
+  'MN': ['Minneapolis', 'Saint Paul'], 'MS': ['Jackson', 'Oxford'], 'MO': ['Kansas City', 'St. Louis'], 'MT': ['Missoula', 'Billings'],
+  'NE': ['Omaha', 'Lincoln'], 'NV': ['Las Vegas', 'Reno'], 'NH': ['Manchester', 'Concord'], 'NJ': ['Newark', 'Jersey City'],
+  'NM': ['Albuquerque', 'Santa Fe'], 'NY': ['New York', 'Brooklyn', 'Buffalo'], 'NC': ['Charlotte', 'Raleigh'], 'ND': ['Fargo', 'Bismarck'],
+  'OH': ['Columbus', 'Cleveland', 'Cincinnati'], 'OK': ['Oklahoma City', 'Tulsa'], 'OR': ['Portland', 'Eugene'],
+  'PA': ['Philadelphia', 'Pittsburgh'], 'RI': ['Providence', 'Newport'], 'SC': ['Charleston', 'Columbia'], 'SD': ['Sioux Falls', 'Rapid City'],
+  'TN': ['Nashville', 'Memphis'], 'TX': ['Austin', 'Houston', 'Dallas', 'San Antonio'], 'UT': ['Salt Lake City', 'Provo'],
+  'VT': ['Burlington', 'Montpelier'], 'VA': ['Richmond', 'Norfolk'], 'WA': ['Seattle', 'Spokane'], 'WV': ['Charleston', 'Morgantown'],
+  'WI': ['Milwaukee', 'Madison'], 'WY': ['Cheyenne', 'Jackson']
+}
+# relative popularity of the genres; anything not listed is rare
+genre_weights = {'Rock n Roll': 20, 'Pop': 18, 'Hip-Hop': 15, 'Alternative': 12, 'Electronic': 10, 'Country': 9, 'R&B': 8,
+                 'Jazz': 7, 'Punk': 5, 'Blues': 5, 'Folk': 4, 'Soul': 4, 'Heavy Metal': 4, 'Reggae': 3, 'Funk': 3}
+states = sorted(area_codes)
+state_weights = list(accumulate(len(area_codes[state]) for state in states))
+genres = [genre for genre, _ in genre_choices]
+genre_cum_weights = list(accumulate(genre_weights.get(genre, 1) for genre in genres))
+days = 3 * 365
+
+
+def pick_genres(rnd):
+  picked = set()
+  count = rnd.choices((1, 2, 3), weights=(5, 3, 2))[0]
+  while len(picked) < count:
+    picked.add(rnd.choices(genres, cum_weights=genre_cum_weights)[0])
+  return sorted(picked)
+
+
+def entity_rows(rnd, model, id):
+  state = rnd.choices(states, cum_weights=state_weights)[0]
+  kind = 'venue' if model is Venue else 'artist'
+  row = {
+    'id': id,
+    'name': ' '.join(rnd.sample(words, rnd.randint(2, 3))),
+    'city': rnd.choice(cities[state]),
+    'state': state,
+    'phone': '{0}-555-{1:04d}'.format(rnd.choice(area_codes[state]), rnd.randrange(10000)),
+    'website': 'https://{0}{1}.example.com'.format(kind, id),
+    'facebook_link': 'https://www.facebook.com/{0}{1}'.format(kind, id),
+    'image_link': 'https://picsum.photos/seed/{0}{1}/300/300'.format(kind, id)
+  }
+  seeking = rnd.random() < 0.3
+  if model is Venue:
+    row['address'] = '{0} {1} St'.format(rnd.randint(1, 9999), rnd.choice(words))
+    row['seeking_talent'] = seeking
+  else:
+    row['seeking_venue'] = seeking
+  row['seeking_description'] = 'Looking for {0} acts'.format(rnd.choice(genres)) if seeking else None
+  names = pick_genres(rnd)
+  row['genre_mask'] = genre_mask(names)
+  return row, names
+
+
+def generate_entities(rnd, model, count, batch_size):
+  genre_model, key = (VenueGenre, 'venue_id') if model is Venue else (ArtistGenre, 'artist_id')
+  next_id = (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+  for start in range(next_id, next_id + count, batch_size):
+    rows, genre_rows = [], []
+    for id in range(start, min(start + batch_size, next_id + count)):
+      row, names = entity_rows(rnd, model, id)
+      rows.append(row)
+      genre_rows.extend({key: id, 'name': name} for name in names)
+    insert_rows(model.__table__, rows)
+    insert_rows(genre_model.__table__, genre_rows)
+    db.session.commit()
+  if db.engine.dialect.name == 'postgresql':
+    db.session.execute('SELECT setval(pg_get_serial_sequence(\'"{0}"\', \'id\'), (SELECT max(id) FROM "{0}"))'.format(model.__tablename__))
+    db.session.commit()
+
+
+def generate_shows(rnd, count, batch_size):
+  # long-tailed bookings: show counts per venue and picks per artist follow
+  # lognormal weights; each venue gets at most one show per day
+  venue_ids = [id for (id,) in db.session.query(Venue.id).order_by(Venue.id)]
+  artist_ids = [id for (id,) in db.session.query(Artist.id).order_by(Artist.id)]
+  if not count or not venue_ids or not artist_ids:
+    return
+  venue_weights = [rnd.lognormvariate(0, 1) for _ in venue_ids]
+  total_weight = sum(venue_weights)
+  artist_cum_weights = list(accumulate(rnd.lognormvariate(0, 1.5) for _ in artist_ids))
+  first_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2 * 365)
+  shows = []
+  for venue_id, weight in zip(venue_ids, venue_weights):
+    num_shows = min(days, int(round(count * weight / total_weight)))
+    for day in rnd.sample(range(days), num_shows):
+      start_time = first_day + timedelta(days=day, hours=rnd.randint(18, 22), minutes=rnd.choice((0, 30)))
+      shows.append({
+        'venue_id': venue_id,
+        'artist_id': rnd.choices(artist_ids, cum_weights=artist_cum_weights)[0],
+        'start_time': start_time,
+        'end_time': start_time + timedelta(minutes=rnd.choice((60, 90, 120, 180)))
+      })
+      if len(shows) == batch_size:
+        insert_shows(shows)
+        shows = []
+  if shows:
+    insert_shows(shows)
+  # /shows reads the listing, so fill it in one INSERT ... SELECT
+  refresh_show_listing()
+  db.session.commit()
+
+
+def insert_rows(table, rows):
+  # multi-row INSERT on Postgres; SQLite caps the bound parameters per statement
+  if db.engine.dialect.name == 'postgresql':
+    db.session.execute(table.insert().values(rows))
+  else:
+    db.session.execute(table.insert(), rows)
+
+
+def insert_shows(shows):
+  count_new_shows(shows)
+  insert_rows(Show.__table__, shows)
+  db.session.commit()
+
+
+def analyze():
+  if db.engine.dialect.name == 'postgresql':
+    for model in (Venue, VenueGenre, Artist, ArtistGenre, Show, ShowListing):
+      db.session.execute('ANALYZE "{0}"'.format(model.__tablename__))
+    db.session.commit()
+
+
+def generate(venues=0, artists=0, shows=0, batch_size=5000, seed=42):
+  rnd = random.Random(seed)
+  generate_entities(rnd, Venue, venues, batch_size)
+  generate_entities(rnd, Artist, artists, batch_size)
+  generate_shows(rnd, shows, batch_size)
+  analyze()
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=app.config['SQLALCHEMY_DATABASE_URI'])
+  parser.add_argument('--venues', type=int, default=0)
+  parser.add_argument('--artists', type=int, default=0)
+  parser.add_argument('--shows', type=int, default=0, help='approximate; long-tailed over the existing venues')
+  parser.add_argument('--batch-size', type=int, default=5000)
+  parser.add_argument('--seed', type=int, default=42)
+  args = parser.parse_args()
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    db.create_all()
+    generate(args.venues, args.artists, args.shows, args.batch_size, args.seed)
+    print('{0} venues, {1} artists, {2} shows.'.format(Venue.query.count(), Artist.query.count(), Show.query.count()))
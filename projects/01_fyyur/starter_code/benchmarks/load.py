@@ -0,0 +1,135 @@
+"""Measures latency percentiles and throughput of every Fyyur read route.
+
+Requests are spread over all GET routes (and the search POSTs) with entity
+ids drawn at random, from a number of concurrent clients. By default they go
+through the Flask test client in this process; pass --base-url to load a
+running server instead. Fill the database with benchmarks/generate.py first,
+e.g.
+
+  $ python benchmarks/generate.py --database-url postgresql://localhost:5432/fyyur_bench --venues 100000 --artists 100000 --shows 1000000
+  $ python benchmarks/load.py --database-url postgresql://localhost:5432/fyyur_bench --requests 200 --concurrency 8 --no-cache
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, page_cache, Venue, Artist
+
+search_terms = ['Blue', 'velvet moon', 'Hall', 'San Francisco, CA', 'Jazz', 'zz']
+skipped = ('static', 'metrics', 'create_venue_submission', 'create_artist_submission', 'create_show_submission',
+           'edit_venue_submission', 'edit_artist_submission', 'delete_venue', 'delete_artist', 'delete_venues', 'delete_artists',
+           'reload_autocomplete')
+
+
+def routes():
+  # (name, method, rule) for every route that does not write
+  for rule in app.url_map.iter_rules():
+    if rule.endpoint in skipped:
+      continue
+    method = 'GET' if 'GET' in rule.methods else 'POST'
+    yield rule.endpoint, method, rule
+
+
+def make_request(rnd, ids, method, rule):
+  values = {arg: rnd.randint(*ids[arg]) for arg in rule.arguments}
+  path = rule.build(values)[1]
+  term = rnd.choice(search_terms)
+  if rule.endpoint == 'autocomplete':
+    return path + '?' + urllib.parse.urlencode({'q': term[:rnd.randint(1, 4)]}), None
+  if method == 'GET':
+    return path + ('?' + urllib.parse.urlencode({'search_term': term}) if 'search' in rule.endpoint else ''), None
+  return path, {'search_term': term}
+
+
+def percentile(values, p):
+  return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def run(num_requests, concurrency, base_url=None, seed=42):
+  with app.app_context():
+    ids = {
+      'venue_id': db.session.query(db.func.min(Venue.id), db.func.max(Venue.id)).one(),
+      'artist_id': db.session.query(db.func.min(Artist.id), db.func.max(Artist.id)).one()
+    }
+  if None in ids['venue_id'] + ids['artist_id']:
+    sys.exit('The database has no venues or artists; run benchmarks/generate.py first.')
+  report = []
+  for name, method, rule in sorted(routes(), key=lambda route: route[0]):
+    timings, statuses = [], {}
+    lock = threading.Lock()
+    def worker(worker_seed, count):
+      rnd = random.Random(worker_seed)
+      client = app.test_client()
+      for _ in range(count):
+        path, data = make_request(rnd, ids, method, rule)
+        start = time.perf_counter()
+        if base_url:
+          request = urllib.request.Request(base_url + path, data=urllib.parse.urlencode(data).encode() if data else None, method=method)
+          try:
+            with urllib.request.urlopen(request) as response:
+              response.read()
+              status = response.status
+          except urllib.error.HTTPError as e:
+            status = e.code
+        else:
+          # buffered, so that streamed responses are timed to their last chunk
+          status = client.open(path, method=method, data=data, buffered=True).status_code
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+          timings.append(elapsed)
+          statuses[status] = statuses.get(status, 0) + 1
+    threads = [threading.Thread(target=worker, args=('{0}-{1}-{2}'.format(seed, name, i), num_requests // concurrency + (i < num_requests % concurrency))) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    wall = time.perf_counter() - started
+    timings.sort()
+    report.append({
+      'route': '{0} {1}'.format(method, rule.rule),
+      'requests': len(timings),
+      'statuses': statuses,
+      'p50_ms': percentile(timings, 50),
+      'p99_ms': percentile(timings, 99),
+      'max_ms': timings[-1],
+      'throughput_rps': len(timings) / wall
+    })
+  return report
+
+
+def print_report(report):
+  print('{0:<45} {1:>8} {2:>10} {3:>10} {4:>10} {5:>10}  {6}'.format('route', 'requests', 'p50 ms', 'p99 ms', 'max ms', 'req/s', 'statuses'))
+  for route in report:
+    print('{0:<45} {1:>8} {2:>10.2f} {3:>10.2f} {4:>10.2f} {5:>10.1f}  {6}'.format(route['route'], route['requests'], route['p50_ms'], route['p99_ms'], route['max_ms'], route['throughput_rps'], route['statuses']))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=app.config['SQLALCHEMY_DATABASE_URI'])
+  parser.add_argument('--base-url', help='load a running server, e.g. http://localhost:5000')
+  parser.add_argument('--requests', type=int, default=100, help='per route')
+  parser.add_argument('--concurrency', type=int, default=4)
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--no-cache', action='store_true', help='disable the page cache of the in-process app')
+  parser.add_argument('--output', help='also write the report as JSON')
+  args = parser.parse_args()
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  app.config['WTF_CSRF_ENABLED'] = False
+  if args.no_cache:
+    page_cache.max_entries = 0
+  report = run(args.requests, args.concurrency, args.base_url, args.seed)
+  print_report(report)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
@@ -0,0 +1,113 @@
+"""Records query plans and latencies for every Fyyur read route.
+
+Each route is requested through the test client with the page cache
+disabled. The SQL it issues is captured and EXPLAINed (EXPLAIN ANALYZE on
+Postgres, EXPLAIN QUERY PLAN on SQLite), and statements whose plan contains
+a full table scan are flagged. Run from the project directory against a
+scratch database migrated with `flask db upgrade`, e.g.
+
+  $ python benchmarks/query_plans.py --database-url postgresql://localhost:5432/fyyur_bench --rows 100000 --shows 1000000 --output plans.json
+
+Comparing the --output files of two runs shows plan and latency regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import app, db, page_cache, Venue, Artist
+from generate import generate
+
+
+def routes():
+  venue_id = db.session.query(Venue.id).order_by(Venue.upcoming_shows_count.desc()).limit(1).scalar()
+  artist_id = db.session.query(Artist.id).order_by(Artist.upcoming_shows_count.desc()).limit(1).scalar()
+  return [
+    ('GET', '/venues', None),
+    ('GET', '/venues/{0}'.format(venue_id), None),
+    ('POST', '/venues/search', {'search_term': 'Blue'}),
+    ('GET', '/artists', None),
+    ('GET', '/artists/{0}'.format(artist_id), None),
+    ('POST', '/artists/search', {'search_term': 'Blue'}),
+    ('GET', '/shows', None),
+    ('GET', '/api/v1/venues/facets?genre=Jazz&state=NY', None)
+  ]
+
+
+def explain(statement, parameters):
+  prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if db.engine.dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN '
+  connection = db.engine.raw_connection()
+  try:
+    cursor = connection.cursor()
+    cursor.execute(prefix + statement, parameters)
+    return [str(row[-1]) for row in cursor.fetchall()]
+  finally:
+    connection.close()
+
+
+def full_scans(plan):
+  # table scans without an index; SQLite also reports scans of materialized subqueries
+  return [line for line in plan if 'Seq Scan' in line or (line.startswith('SCAN ') and ' USING ' not in line and not line.startswith(('SCAN anon_', 'SCAN (subquery')))]
+
+
+def run(repeat):
+  client = app.test_client()
+  report = []
+  for method, url, data in routes():
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+      statements.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    client.open(url, method=method, data=data)
+    event.remove(db.engine, 'before_cursor_execute', capture)
+    timings = []
+    for _ in range(repeat):
+      start = time.perf_counter()
+      client.open(url, method=method, data=data)
+      timings.append((time.perf_counter() - start) * 1000)
+    plans = [{'statement': statement, 'plan': explain(statement, parameters)} for statement, parameters in statements]
+    report.append({
+      'route': '{0} {1}'.format(method, url),
+      'queries': len(statements),
+      'p50_ms': statistics.median(timings),
+      'max_ms': max(timings),
+      'plans': plans
+    })
+  return report
+
+
+def print_report(report):
+  for route in report:
+    print('{0}  queries={1}  p50={2:.2f}ms  max={3:.2f}ms'.format(route['route'], route['queries'], route['p50_ms'], route['max_ms']))
+    for plan in route['plans']:
+      scans = full_scans(plan['plan'])
+      print('  {0}{1}'.format('FULL SCAN ' if scans else '', ' '.join(plan['statement'].split())[:120]))
+      for line in plan['plan']:
+        print('    ' + line)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=app.config['SQLALCHEMY_DATABASE_URI'])
+  parser.add_argument('--rows', type=int, default=0, help='venues and artists to add first')
+  parser.add_argument('--shows', type=int, default=0, help='shows to add first')
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--output', help='also write the report as JSON')
+  args = parser.parse_args()
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  app.config['WTF_CSRF_ENABLED'] = False
+  page_cache.max_entries = 0
+  with app.app_context():
+    db.create_all()
+    generate(venues=args.rows, artists=args.rows, shows=args.shows)
+    report = run(args.repeat)
+  print_report(report)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
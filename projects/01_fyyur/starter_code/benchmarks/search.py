@@ -0,0 +1,46 @@
+"""Generates venues and artists and times the venue and artist search.
+
+Run from the project directory against a scratch database that has been
+migrated with `flask db upgrade` (the search indexes live in the migrations):
+
+  $ python benchmarks/search.py --database-url postgresql://localhost:5432/fyyur_bench --rows 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, Venue, VenueGenre, Artist, ArtistGenre, search
+from generate import generate
+
+terms = ['Blue', 'velvet moon', 'Hall', 'San Francisco, CA', 'Jazz', 'zz', 'Tigr']
+
+
+def run(repeat):
+  print('{0:<10} {1:<20} {2:>8} {3:>10} {4:>10}'.format('model', 'term', 'count', 'p50 ms', 'max ms'))
+  for model, genre_model in ((Venue, VenueGenre), (Artist, ArtistGenre)):
+    for term in terms:
+      timings = []
+      for _ in range(repeat):
+        start = time.perf_counter()
+        results = search(model, genre_model, term)
+        timings.append((time.perf_counter() - start) * 1000)
+      count = '{0}{1}'.format(results['count'], '+' if results['count_capped'] else '')
+      print('{0:<10} {1:<20} {2:>8} {3:>10.2f} {4:>10.2f}'.format(model.__name__, term, count, statistics.median(timings), max(timings)))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', default=app.config['SQLALCHEMY_DATABASE_URI'])
+  parser.add_argument('--rows', type=int, default=0, help='venues and artists to add before timing')
+  parser.add_argument('--repeat', type=int, default=20)
+  args = parser.parse_args()
+  app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+  with app.app_context():
+    db.create_all()
+    if args.rows:
+      generate(venues=args.rows, artists=args.rows)
+    run(args.repeat)
@@ -0,0 +1,81 @@
+"""Measures the cold start of a fresh Fyyur worker process.
+
+Each run starts a new Python process that imports the app, compiles every
+template and serves one request, and reports the import time, the template
+compile time and the time to the first byte of that request. Runs are made
+without a bytecode cache, with an empty one and with a filled one. Run from
+the project directory, e.g.
+
+  $ python benchmarks/startup.py --runs 10 --path /venues --database-url postgresql://localhost:5432/fyyur_bench
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+worker = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import config
+config.TEMPLATE_CACHE_DIR = {cache_dir!r}
+config.TEMPLATE_WARM_UP = False
+if {database_url!r}:
+  config.SQLALCHEMY_DATABASE_URI = {database_url!r}
+import app
+imported = time.perf_counter()
+app.warm_templates()
+compiled = time.perf_counter()
+response = app.app.test_client().get({path!r}, buffered=False)
+next(iter(response.response), b'')
+first_byte = time.perf_counter()
+print(json.dumps({{
+  'import_ms': (imported - started) * 1000,
+  'compile_ms': (compiled - imported) * 1000,
+  'ttfb_ms': (first_byte - compiled) * 1000,
+  'status': response.status_code
+}}))
+'''
+
+
+def start_worker(cache_dir, path, database_url):
+  started = time.perf_counter()
+  output = subprocess.run([sys.executable, '-c', worker.format(root=root, cache_dir=cache_dir, path=path, database_url=database_url)], cwd=root, check=True, stdout=subprocess.PIPE).stdout
+  result = json.loads(output.decode().splitlines()[-1])
+  result['process_ms'] = (time.perf_counter() - started) * 1000
+  return result
+
+
+def run(runs, path, database_url=None):
+  report = []
+  cache_dir = tempfile.mkdtemp()
+  try:
+    scenarios = [
+      ('no cache', lambda: None),
+      ('empty cache', lambda: shutil.rmtree(cache_dir, ignore_errors=True) or cache_dir),
+      ('filled cache', lambda: cache_dir)
+    ]
+    for name, prepare in scenarios:
+      results = [start_worker(prepare(), path, database_url) for _ in range(runs)]
+      report.append(dict({key: statistics.median(result[key] for result in results) for key in ('import_ms', 'compile_ms', 'ttfb_ms', 'process_ms')}, scenario=name, status=results[-1]['status']))
+  finally:
+    shutil.rmtree(cache_dir, ignore_errors=True)
+  return report
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url', help='defaults to SQLALCHEMY_DATABASE_URI; needed for routes that query')
+  parser.add_argument('--path', default='/', help='route of the first request')
+  parser.add_argument('--runs', type=int, default=5)
+  args = parser.parse_args()
+  print('{0:<14} {1:>10} {2:>11} {3:>9} {4:>11}  {5}'.format('scenario', 'import ms', 'compile ms', 'ttfb ms', 'process ms', 'status'))
+  for result in run(args.runs, args.path, args.database_url):
+    print('{0:<14} {1:>10.1f} {2:>11.1f} {3:>9.1f} {4:>11.1f}  {5}'.format(result['scenario'], result['import_ms'], result['compile_ms'], result['ttfb_ms'], result['process_ms'], result['status']))
@@ -0,0 +1,57 @@
+PRODUCT_ID = '-//Fyyur//Fyyur//EN'
+
+
+def escape(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    # content lines are at most 75 octets; continuation lines start with a space
+    parts, current, size = [], '', 0
+    for char in line:
+        length = len(char.encode('utf-8'))
+        if size + length > 75:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += length
+    parts.append(current)
+    return '\r\n'.join(parts)
+
+
+def format_datetime(value, utc=False):
+    return value.strftime('%Y%m%dT%H%M%S') + ('Z' if utc else '')
+
+
+def vevent(uid, start, end, summary, location, stamp):
+    """Returns one VEVENT as CRLF terminated lines.
+
+    Shows are stored in local time without a zone, so start and end are
+    written as floating times; stamp is in UTC.
+    """
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:' + uid,
+        'DTSTAMP:' + format_datetime(stamp, utc=True),
+        'DTSTART:' + format_datetime(start),
+        'DTEND:' + format_datetime(end),
+        'SUMMARY:' + escape(summary),
+        'LOCATION:' + escape(location),
+        'END:VEVENT'
+    ]
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def vcalendar(name, events):
+    """Yields a VCALENDAR piece by piece around the VEVENT strings of events."""
+    yield ''.join(fold(line) + '\r\n' for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:' + PRODUCT_ID,
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:' + escape(name)
+    ])
+    for event in events:
+        yield event
+    yield 'END:VCALENDAR\r\n'
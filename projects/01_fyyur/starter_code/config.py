@@ -1,7 +1,44 @@
 import os
+import tempfile
 
 SECRET_KEY = os.urandom(32)
 basedir = os.path.abspath(os.path.dirname(__file__))
 DEBUG = True
 SQLALCHEMY_DATABASE_URI = 'postgres://jule@localhost:5432/fyyur'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+SEARCH_PAGE_SIZE = 20
+# search reads at most this many matches + 1 per index for the count, shown as e.g. "100+" above it
+SEARCH_COUNT_LIMIT = 100
+PAST_SHOWS_LIMIT = 50
+# rendered pages are cached in each worker process; a write only drops the
+# entries of the worker that handled it, so other workers can serve a stale
+# page for up to PAGE_CACHE_TTL seconds
+PAGE_CACHE_MAX_ENTRIES = 1024
+PAGE_CACHE_TTL = 300
+LISTING_PAGE_SIZE = 30
+DEFAULT_SHOW_DURATION = 120
+API_STREAM_BATCH_SIZE = 500
+SLOW_QUERY_LOG_SIZE = 10
+PAST_SHOWS_WINDOW_DAYS = 730
+# read requests go to one of these when set, e.g. ['postgresql://replica1:5432/fyyur']
+SQLALCHEMY_REPLICA_URIS = []
+SQLALCHEMY_READ_YOUR_WRITES_SECONDS = 5
+# compiled templates are cached here and all templates are compiled at start; None disables the cache.
+# It is outside the source tree, which may be read-only; an unwritable directory also disables it
+TEMPLATE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'fyyur-jinja-cache')
+TEMPLATE_WARM_UP = True
+# log records are written in batches by a background thread and rotated by size
+LOG_FILE = 'error.log'
+REQUEST_LOG_FILE = 'requests.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 256
+MATCH_INDEX_TTL = 300
+MATCHES_LIMIT = 20
+AUTOCOMPLETE_WARM_UP = True
+# each worker rebuilds its name index in the background once it is this old,
+# so names changed through other workers show up within that many seconds
+AUTOCOMPLETE_INDEX_TTL = 300
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
@@ -0,0 +1,31 @@
+from functools import lru_cache
+
+import babel
+import babel.dates
+
+patterns = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+class DateTimeFormatter:
+    """Formats datetimes for one locale with pre-parsed patterns.
+
+    The named patterns are parsed once, other patterns on first use, and
+    formatted values are memoized since listings repeat the same start times.
+    """
+
+    def __init__(self, locale=babel.dates.LC_TIME, maxsize=4096):
+        self.locale = babel.Locale.parse(locale)
+        self._patterns = {name: babel.dates.parse_pattern(pattern) for name, pattern in patterns.items()}
+        self.format = lru_cache(maxsize=maxsize)(self._format)
+
+    def format_many(self, values, format='medium'):
+        return [self.format(value, format) for value in values]
+
+    def _format(self, value, format='medium'):
+        pattern = self._patterns.get(format)
+        if pattern is None:
+            pattern = self._patterns.setdefault(format, babel.dates.parse_pattern(format))
+        return pattern.apply(value, self.locale)
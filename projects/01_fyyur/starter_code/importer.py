@@ -0,0 +1,41 @@
+import csv
+import json
+import os
+from itertools import islice
+
+
+def read_rows(path, format=None, list_fields=('genres',)):
+    """Yields (line number, row dict) pairs from a CSV or JSONL file.
+
+    The file is read one line at a time. In CSV files the list_fields hold
+    comma separated values, e.g. "Jazz,Blues". JSONL lines that cannot be
+    parsed are yielded with a row of None.
+    """
+    format = format or os.path.splitext(path)[1].lstrip('.').lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                for field in list_fields:
+                    if row.get(field):
+                        row[field] = [value.strip() for value in row[field].split(',') if value.strip()]
+                yield reader.line_num, row
+        elif format in ('jsonl', 'ndjson'):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row
+        else:
+            raise ValueError('Unsupported import format: {0}'.format(format))
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
@@ -0,0 +1,115 @@
+import heapq
+import time
+from threading import Lock
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Marks a view as running at most max_queries SQL statements."""
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+
+class RequestStats:
+
+    def __init__(self, slowest):
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []
+        self._max_slowest = slowest
+
+    def record(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        heapq.heappush(self.slowest, (duration, statement))
+        if len(self.slowest) > self._max_slowest:
+            heapq.heappop(self.slowest)
+
+
+class Instrumentation:
+    """Records the SQL statements run while handling each request.
+
+    Cursor events of every engine are timed and attributed to the current
+    request. In debug mode the query count and DB time of a request are sent
+    as X-Query-Count and X-DB-Time headers; stats() aggregates them per
+    endpoint together with the slowest statements seen. Views marked with
+    query_budget() log a warning, or raise QueryBudgetExceeded when testing,
+    if they run more statements than their budget. Statements run while a
+    streamed response is sent are not attributed.
+    """
+
+    def __init__(self, app=None, slowest=10):
+        self.slowest = slowest
+        self._routes = {}
+        self._slowest = []
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for endpoint, route in self._routes.items():
+                routes[endpoint] = dict(route, avg_queries=route['queries'] / route['requests'], avg_db_time_ms=route['db_time_ms'] / route['requests'])
+            slowest = [{'duration_ms': duration * 1000, 'statement': statement} for duration, statement in sorted(self._slowest, reverse=True)]
+        return {'routes': routes, 'slowest': slowest}
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._slowest = []
+
+    def _before_request(self):
+        g.query_stats = RequestStats(self.slowest)
+
+    def _after_request(self, response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        with self._lock:
+            route = self._routes.setdefault(endpoint, {'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time_ms': 0.0})
+            route['requests'] += 1
+            route['queries'] += stats.queries
+            route['max_queries'] = max(route['max_queries'], stats.queries)
+            route['db_time_ms'] += stats.db_time * 1000
+            for entry in stats.slowest:
+                heapq.heappush(self._slowest, entry)
+                if len(self._slowest) > self.slowest:
+                    heapq.heappop(self._slowest)
+        if self.app.debug:
+            response.headers['X-Query-Count'] = str(stats.queries)
+            response.headers['X-DB-Time'] = '{0:.2f}ms'.format(stats.db_time * 1000)
+        budget = getattr(self.app.view_functions.get(request.endpoint), 'query_budget', None)
+        if budget is not None and stats.queries > budget:
+            message = '{0} ran {1} queries, over its budget of {2}'.format(endpoint, stats.queries, budget)
+            if self.app.testing:
+                raise QueryBudgetExceeded(message)
+            self.app.logger.warning(message)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        if has_request_context():
+            stats = g.get('query_stats')
+            if stats is not None:
+                stats.record(statement, duration)
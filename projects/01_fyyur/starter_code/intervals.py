@@ -0,0 +1,35 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex:
+    """Sorted index of disjoint half-open [start, end) intervals.
+
+    Bookings at a venue never overlap, so ordering them by start orders them
+    by end as well and an overlap check is a single binary search. Legacy
+    intervals that do overlap are merged on load to keep that invariant.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for start, end in sorted(intervals):
+            if self._ends and start < self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def overlaps(self, start, end):
+        # the only candidate is the last interval starting before end
+        i = bisect_left(self._starts, end)
+        return i > 0 and self._ends[i - 1] > start
+
+    def add(self, start, end):
+        if self.overlaps(start, end):
+            raise ValueError('Interval overlaps an existing one')
+        i = bisect_right(self._starts, start)
+        self._starts.insert(i, start)
+        self._ends.insert(i, end)
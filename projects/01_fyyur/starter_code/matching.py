@@ -0,0 +1,68 @@
+import heapq
+from collections import Counter
+from threading import Lock
+
+
+def mask_bits(mask):
+    bit = 0
+    while mask:
+        if mask & 1:
+            yield bit
+        mask >>= 1
+        bit += 1
+
+
+class MatchIndex:
+    """Inverted index from (genre bit, state) to the entities seeking a match.
+
+    Entities are (id, name, city, state, genre_mask) tuples. A lookup only
+    touches the postings of the seeker's genres in its state, so it costs
+    as much as there are candidates, however large the tables are.
+    Candidates are ranked by the number of shared genres, then those in the
+    seeker's city first, then by id.
+    """
+
+    def __init__(self, entities=()):
+        self._postings = {}
+        self._entities = {}
+        self._lock = Lock()
+        for entity in entities:
+            self.add(*entity)
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, id):
+        return id in self._entities
+
+    def add(self, id, name, city, state, genre_mask):
+        with self._lock:
+            self._remove(id)
+            self._entities[id] = (name, city, state, genre_mask)
+            for bit in mask_bits(genre_mask):
+                self._postings.setdefault((bit, state), set()).add(id)
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def matches(self, city, state, genre_mask, limit=None):
+        """Returns ranked (id, name, city, shared genre mask) tuples."""
+        with self._lock:
+            shared = Counter()
+            for bit in mask_bits(genre_mask):
+                shared.update(self._postings.get((bit, state), ()))
+            def rank(id):
+                return (-shared[id], self._entities[id][1] != city, id)
+            ids = sorted(shared, key=rank) if limit is None else heapq.nsmallest(limit, shared, key=rank)
+            return [(id, self._entities[id][0], self._entities[id][1], self._entities[id][3] & genre_mask) for id in ids]
+
+    def _remove(self, id):
+        entity = self._entities.pop(id, None)
+        if entity is None:
+            return
+        for bit in mask_bits(entity[3]):
+            postings = self._postings[(bit, entity[2])]
+            postings.discard(id)
+            if not postings:
+                del self._postings[(bit, entity[2])]
@@ -0,0 +1,26 @@
+"""keyset pagination indexes
+
+Revision ID: 5c00b9facd55
+Revises: b381ef0bc5d0
+Create Date: 2026-10-18 11:21:05.730592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c00b9facd55'
+down_revision = 'b381ef0bc5d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_start_time_venue_id_artist_id', 'Show', ['start_time', 'venue_id', 'artist_id'], unique=False)
+    op.create_index('ix_Artist_name_id', 'Artist', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_name_id', table_name='Artist')
+    op.drop_index('ix_Show_start_time_venue_id_artist_id', table_name='Show')
@@ -0,0 +1,34 @@
+"""trigram gist indexes for ranked search
+
+Revision ID: 6beb2530b7b9
+Revises: 86ca1fa4d366
+Create Date: 2026-10-18 23:41:52.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6beb2530b7b9'
+down_revision = '86ca1fa4d366'
+branch_labels = None
+depends_on = None
+
+columns = (('name', 'name'), ('location', "(city || ', ' || state)"))
+
+
+def upgrade():
+    # search orders by trigram distance (<->), which only a gist index can
+    # return rows in; it also serves the ILIKE filters the gin indexes did
+    for table in ('Venue', 'Artist'):
+        for name, expression in columns:
+            op.drop_index('ix_{0}_{1}_trgm'.format(table, name), table_name=table)
+            op.execute('CREATE INDEX "ix_{0}_{1}_trgm" ON "{0}" USING gist ({2} gist_trgm_ops(siglen=256))'.format(table, name, expression))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        for name, expression in columns:
+            op.drop_index('ix_{0}_{1}_trgm'.format(table, name), table_name=table)
+            op.execute('CREATE INDEX "ix_{0}_{1}_trgm" ON "{0}" USING gin ({2} gin_trgm_ops)'.format(table, name, expression))
@@ -0,0 +1,29 @@
+"""genre name indexes for search
+
+Revision ID: 86ca1fa4d366
+Revises: f3d965cbf5ad
+Create Date: 2026-10-18 22:14:05.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '86ca1fa4d366'
+down_revision = 'f3d965cbf5ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # genres are matched by exact name, so a btree replaces the trigram index
+    for genre_table, key in (('VenueGenre', 'venue_id'), ('ArtistGenre', 'artist_id')):
+        op.drop_index('ix_{0}_name_trgm'.format(genre_table), table_name=genre_table)
+        op.create_index('ix_{0}_name_{1}'.format(genre_table, key), genre_table, ['name', key], unique=False)
+
+
+def downgrade():
+    for genre_table, key in (('VenueGenre', 'venue_id'), ('ArtistGenre', 'artist_id')):
+        op.drop_index('ix_{0}_name_{1}'.format(genre_table, key), table_name=genre_table)
+        op.execute('CREATE INDEX "ix_{0}_name_trgm" ON "{0}" USING gin (name gin_trgm_ops)'.format(genre_table))
@@ -0,0 +1,41 @@
+"""denormalized show counts
+
+Revision ID: 94316fa408d0
+Revises: 1c6bcf2cf549
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '94316fa408d0'
+down_revision = '1c6bcf2cf549'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('counted_as_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.add_column('Venue', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Venue', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('Artist', sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill the counts from the existing shows
+    op.execute('UPDATE "Show" SET counted_as_past = start_time <= LOCALTIMESTAMP')
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(
+            'UPDATE "{0}" SET '
+            'upcoming_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id AND NOT "Show".counted_as_past), '
+            'past_shows_count = (SELECT count(*) FROM "Show" WHERE "Show".{1} = "{0}".id AND "Show".counted_as_past)'.format(table, key)
+        )
+
+
+def downgrade():
+    op.drop_column('Artist', 'past_shows_count')
+    op.drop_column('Artist', 'upcoming_shows_count')
+    op.drop_column('Venue', 'past_shows_count')
+    op.drop_column('Venue', 'upcoming_shows_count')
+    op.drop_column('Show', 'counted_as_past')
@@ -0,0 +1,45 @@
+"""genre dimension and genre masks
+
+Revision ID: 9dd5d17d0fea
+Revises: f9a3098e58c1
+Create Date: 2026-10-18 13:48:12.407716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9dd5d17d0fea'
+down_revision = 'f9a3098e58c1'
+branch_labels = None
+depends_on = None
+
+# the genre_choices of forms.py at the time of this revision, in id order
+genres = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Swing', 'Other']
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.bulk_insert(genre, [{'id': id, 'name': name} for id, name in enumerate(genres, 1)])
+    for table, genre_table, owner in (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id')):
+        op.add_column(table, sa.Column('genre_mask', sa.BigInteger(), server_default='0', nullable=False))
+        op.execute(
+            'UPDATE "{0}" SET genre_mask = COALESCE(('
+            'SELECT SUM(CAST(1 AS BIGINT) << ("Genre".id - 1)) '
+            'FROM (SELECT DISTINCT {2}, name FROM "{1}") AS owned JOIN "Genre" ON "Genre".name = owned.name '
+            'WHERE owned.{2} = "{0}".id), 0)'.format(table, genre_table, owner)
+        )
+        op.create_index('ix_{0}_state_genre_mask'.format(table), table, ['state', 'genre_mask'], unique=False)
+
+
+def downgrade():
+    for table in ('Artist', 'Venue'):
+        op.drop_index('ix_{0}_state_genre_mask'.format(table), table_name=table)
+        op.drop_column(table, 'genre_mask')
+    op.drop_table('Genre')
@@ -0,0 +1,38 @@
+"""cascade venue and artist deletes to genres and shows
+
+Revision ID: a56ea7ddcc0c
+Revises: c06f8fae6102
+Create Date: 2026-10-18 15:10:37.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a56ea7ddcc0c'
+down_revision = 'c06f8fae6102'
+branch_labels = None
+depends_on = None
+
+foreign_keys = [
+    ('VenueGenre', 'venue_id', 'Venue'),
+    ('ArtistGenre', 'artist_id', 'Artist'),
+    ('Show', 'venue_id', 'Venue'),
+    ('Show', 'artist_id', 'Artist')
+]
+
+
+def replace_foreign_keys(ondelete):
+    for table, column, referred in foreign_keys:
+        name = '{0}_{1}_fkey'.format(table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
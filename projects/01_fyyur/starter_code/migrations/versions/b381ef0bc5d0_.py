@@ -0,0 +1,33 @@
+"""trigram search indexes
+
+Revision ID: b381ef0bc5d0
+Revises: 94316fa408d0
+Create Date: 2026-10-18 10:03:17.554031
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b381ef0bc5d0'
+down_revision = '94316fa408d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, genre_table, key in (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id')):
+        op.execute('CREATE INDEX "ix_{0}_name_trgm" ON "{0}" USING gin (name gin_trgm_ops)'.format(table))
+        op.execute('CREATE INDEX "ix_{0}_location_trgm" ON "{0}" USING gin ((city || \', \' || state) gin_trgm_ops)'.format(table))
+        op.execute('CREATE INDEX "ix_{0}_name_trgm" ON "{0}" USING gin (name gin_trgm_ops)'.format(genre_table))
+        op.create_index(op.f('ix_{0}_{1}'.format(genre_table, key)), genre_table, [key], unique=False)
+
+
+def downgrade():
+    for table, genre_table, key in (('Venue', 'VenueGenre', 'venue_id'), ('Artist', 'ArtistGenre', 'artist_id')):
+        op.drop_index(op.f('ix_{0}_{1}'.format(genre_table, key)), table_name=genre_table)
+        op.drop_index('ix_{0}_name_trgm'.format(genre_table), table_name=genre_table)
+        op.drop_index('ix_{0}_location_trgm'.format(table), table_name=table)
+        op.drop_index('ix_{0}_name_trgm'.format(table), table_name=table)
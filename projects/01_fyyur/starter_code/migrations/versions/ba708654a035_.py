@@ -0,0 +1,29 @@
+"""show time range indexes
+
+Revision ID: ba708654a035
+Revises: 5c00b9facd55
+Create Date: 2026-10-18 12:02:48.310957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ba708654a035'
+down_revision = '5c00b9facd55'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # global ordering by time is served by ix_Show_start_time_venue_id_artist_id;
+    # the primary key (venue_id, artist_id, start_time) cannot return a venue's
+    # shows in time order, hence the venue-side index as well
+    op.create_index('ix_Show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
@@ -0,0 +1,94 @@
+"""partition Show by month of start_time
+
+Revision ID: c06f8fae6102
+Revises: 9dd5d17d0fea
+Create Date: 2026-10-18 14:36:51.220874
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c06f8fae6102'
+down_revision = '9dd5d17d0fea'
+branch_labels = None
+depends_on = None
+
+indexes = [
+    ('ix_Show_start_time_venue_id_artist_id', ['start_time', 'venue_id', 'artist_id']),
+    ('ix_Show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_Show_artist_id_start_time', ['artist_id', 'start_time'])
+]
+columns = 'venue_id, artist_id, start_time, end_time, counted_as_past'
+no_double_booking = 'EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)'
+# monthly partitions are created from the first show up to this many months ahead;
+# `flask show-partitions` keeps creating them from there
+months_ahead = 12
+
+
+def create_show_table(name, partitioned):
+    op.execute(
+        'CREATE TABLE "{0}" ('
+        'venue_id INTEGER NOT NULL CONSTRAINT "{0}_venue_id_fkey" REFERENCES "Venue" (id), '
+        'artist_id INTEGER NOT NULL CONSTRAINT "{0}_artist_id_fkey" REFERENCES "Artist" (id), '
+        'start_time TIMESTAMP WITHOUT TIME ZONE NOT NULL, '
+        'end_time TIMESTAMP WITHOUT TIME ZONE NOT NULL, '
+        'counted_as_past BOOLEAN DEFAULT false NOT NULL, '
+        'CONSTRAINT "{0}_pkey" PRIMARY KEY (venue_id, artist_id, start_time))'
+        '{1}'.format(name, ' PARTITION BY RANGE (start_time)' if partitioned else '')
+    )
+
+
+def rename_constraints(table, old, new):
+    # the old table's constraints are renamed before the new table is created,
+    # or Postgres would name the new foreign keys Show_venue_id_fkey1 and so on
+    for suffix in ('pkey', 'venue_id_fkey', 'artist_id_fkey'):
+        op.execute('ALTER TABLE "{0}" RENAME CONSTRAINT "{1}_{3}" TO "{2}_{3}"'.format(table, old, new, suffix))
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    for name, _ in indexes:
+        op.drop_index(name, table_name='Show')
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT "Show_no_double_booking"')
+    rename_constraints('Show', 'Show', 'Show_unpartitioned')
+    op.rename_table('Show', 'Show_unpartitioned')
+
+    create_show_table('Show', partitioned=True)
+    partitions = ['Show_default']
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+    now = datetime.now()
+    first = bind.execute('SELECT min(start_time) FROM "Show_unpartitioned"').scalar() or now
+    month, last = (first.year, first.month), (now.year + (now.month - 1 + months_ahead) // 12, (now.month - 1 + months_ahead) % 12 + 1)
+    while month <= last:
+        following = (month[0] + month[1] // 12, month[1] % 12 + 1)
+        name = 'Show_y{0:04d}m{1:02d}'.format(*month)
+        op.execute('CREATE TABLE "{0}" PARTITION OF "Show" FOR VALUES FROM (\'{1:04d}-{2:02d}-01\') TO (\'{3:04d}-{4:02d}-01\')'.format(name, month[0], month[1], following[0], following[1]))
+        partitions.append(name)
+        month = following
+
+    op.execute('INSERT INTO "Show" ({0}) SELECT {0} FROM "Show_unpartitioned"'.format(columns))
+    op.drop_table('Show_unpartitioned')
+    for name, index_columns in indexes:
+        op.create_index(name, 'Show', index_columns, unique=False)
+    # exclusion constraints cannot span partitions, so every partition gets its own
+    for name in partitions:
+        op.execute('ALTER TABLE "{0}" ADD CONSTRAINT "{0}_no_double_booking" {1}'.format(name, no_double_booking))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    create_show_table('Show_unpartitioned', partitioned=False)
+    op.execute('INSERT INTO "Show_unpartitioned" ({0}) SELECT {0} FROM "Show"'.format(columns))
+    op.drop_table('Show')
+    op.rename_table('Show_unpartitioned', 'Show')
+    rename_constraints('Show', 'Show_unpartitioned', 'Show')
+    for name, index_columns in indexes:
+        op.create_index(name, 'Show', index_columns, unique=False)
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_no_double_booking" {0}'.format(no_double_booking))
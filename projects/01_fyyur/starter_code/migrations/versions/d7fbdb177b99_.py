@@ -0,0 +1,44 @@
+"""show listing read model
+
+Revision ID: d7fbdb177b99
+Revises: a56ea7ddcc0c
+Create Date: 2026-10-18 19:42:05.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7fbdb177b99'
+down_revision = 'a56ea7ddcc0c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ShowListing',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=False),
+    sa.Column('artist_image_link', sa.String(), nullable=True),
+    sa.Column('venue_name', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'artist_id', 'start_time')
+    )
+    op.execute(
+        'INSERT INTO "ShowListing" (venue_id, artist_id, start_time, end_time, artist_name, artist_image_link, venue_name) '
+        'SELECT "Show".venue_id, "Show".artist_id, "Show".start_time, "Show".end_time, "Artist".name, "Artist".image_link, "Venue".name '
+        'FROM "Show" JOIN "Artist" ON "Artist".id = "Show".artist_id JOIN "Venue" ON "Venue".id = "Show".venue_id'
+    )
+    op.create_index('ix_ShowListing_start_time_venue_id_artist_id', 'ShowListing', ['start_time', 'venue_id', 'artist_id'], unique=False)
+    op.create_index('ix_ShowListing_artist_id', 'ShowListing', ['artist_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ShowListing_artist_id', table_name='ShowListing')
+    op.drop_index('ix_ShowListing_start_time_venue_id_artist_id', table_name='ShowListing')
+    op.drop_table('ShowListing')
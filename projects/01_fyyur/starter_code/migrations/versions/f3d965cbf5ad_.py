@@ -0,0 +1,28 @@
+"""row versions for detail page ETags
+
+Revision ID: f3d965cbf5ad
+Revises: d7fbdb177b99
+Create Date: 2026-10-18 20:31:47.560921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3d965cbf5ad'
+down_revision = 'd7fbdb177b99'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # updated_at is naive UTC; now() on its own would be the session's local time
+    now = sa.text("timezone('utc', now())") if op.get_bind().dialect.name == 'postgresql' else sa.func.now()
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=now, nullable=False))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'updated_at')
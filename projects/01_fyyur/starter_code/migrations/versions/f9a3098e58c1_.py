@@ -0,0 +1,33 @@
+"""show end times and venue double-booking constraint
+
+Revision ID: f9a3098e58c1
+Revises: ba708654a035
+Create Date: 2026-10-18 13:02:44.918305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9a3098e58c1'
+down_revision = 'ba708654a035'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    op.execute('UPDATE "Show" SET end_time = start_time + INTERVAL \'120 minutes\'')
+    op.alter_column('Show', 'end_time', nullable=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        # btree_gist lets the GiST index combine venue_id equality with range overlap;
+        # fails if a venue already has overlapping shows, which have to be moved first
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_no_double_booking" EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE "Show" DROP CONSTRAINT "Show_no_double_booking"')
+    op.drop_column('Show', 'end_time')
@@ -0,0 +1,72 @@
+import re
+from datetime import datetime
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return datetime(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return '{0}_y{1:04d}m{2:02d}'.format(table, month.year, month.month)
+
+
+def monthly_partitions(connection, table):
+    """Returns {month: partition name} for the monthly partitions of a Postgres table."""
+    pattern = re.compile(r'^{0}_y(\d{{4}})m(\d{{2}})$'.format(re.escape(table)))
+    names = connection.execute(
+        'SELECT child.relname FROM pg_inherits '
+        'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+        'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+        'WHERE parent.relname = %(table)s', {'table': table}
+    )
+    partitions = {}
+    for (name,) in names:
+        match = pattern.match(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(connection, table, month, column, setup=()):
+    """Creates and attaches the partition of table for the month starting at month.
+
+    Rows of that month that went to the default partition are moved into the
+    new one first, as Postgres refuses to attach it otherwise. setup holds
+    extra statements for the new table, with {name} standing for its name.
+    """
+    name = partition_name(table, month)
+    bounds = {'start': month, 'end': add_months(month, 1)}
+    connection.execute('CREATE TABLE "{0}" (LIKE "{1}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'.format(name, table))
+    for statement in setup:
+        connection.execute(statement.format(name=name))
+    default = table + '_default'
+    if connection.execute('SELECT to_regclass(%(default)s)', {'default': '"{0}"'.format(default)}).scalar():
+        in_range = '{0} >= %(start)s AND {0} < %(end)s'.format(column)
+        connection.execute('INSERT INTO "{0}" SELECT * FROM "{1}" WHERE {2}'.format(name, default, in_range), bounds)
+        connection.execute('DELETE FROM "{0}" WHERE {1}'.format(default, in_range), bounds)
+    connection.execute('ALTER TABLE "{0}" ATTACH PARTITION "{1}" FOR VALUES FROM (%(start)s) TO (%(end)s)'.format(table, name), bounds)
+    return name
+
+
+def detach_partition(connection, table, name, archive_schema=None):
+    """Detaches a partition and either drops it or moves it to archive_schema.
+
+    Archived tables lose their foreign keys, so that the rows they reference
+    can still be deleted.
+    """
+    connection.execute('ALTER TABLE "{0}" DETACH PARTITION "{1}"'.format(table, name))
+    if archive_schema is None:
+        connection.execute('DROP TABLE "{0}"'.format(name))
+        return
+    foreign_keys = connection.execute(
+        'SELECT conname FROM pg_constraint WHERE contype = \'f\' AND conrelid = to_regclass(%(name)s)', {'name': '"{0}"'.format(name)}
+    ).fetchall()
+    for (constraint,) in foreign_keys:
+        connection.execute('ALTER TABLE "{0}" DROP CONSTRAINT "{1}"'.format(name, constraint))
+    connection.execute('CREATE SCHEMA IF NOT EXISTS "{0}"'.format(archive_schema))
+    connection.execute('ALTER TABLE "{0}" SET SCHEMA "{1}"'.format(name, archive_schema))
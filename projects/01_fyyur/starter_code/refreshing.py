@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshingIndex:
+    """An in-memory index built from the database and rebuilt once it is stale.
+
+    build() returns a new index. The first get() builds it in the caller.
+    After that, a get() on an index older than ttl seconds starts one
+    background thread, running in an app context, that builds the
+    replacement while the old index keeps answering. Changes made with
+    update() during a rebuild go to the old index and are replayed onto the
+    new one before it is swapped in, so none are lost.
+    """
+
+    def __init__(self, app, build, ttl):
+        self.app = app
+        self.build = build
+        self.ttl = ttl
+        self._lock = Lock()
+        self._rebuilding = Lock()
+        self._index = None
+        self._built_at = None
+        self._pending = None
+
+    @property
+    def built(self):
+        return self._index is not None
+
+    def get(self):
+        index, built_at = self._index, self._built_at
+        if index is None:
+            with self._rebuilding:
+                return self._index if self._index is not None else self._rebuild()
+        if built_at is not None and time.monotonic() - built_at > self.ttl and self._rebuilding.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, name='index-rebuild', daemon=True).start()
+        return index
+
+    def refresh(self):
+        """Rebuilds the index in the caller and returns it."""
+        with self._rebuilding:
+            return self._rebuild()
+
+    def update(self, change):
+        # change(index) is applied now, and again to an index being rebuilt
+        with self._lock:
+            if self._index is None:
+                return
+            change(self._index)
+            if self._pending is not None:
+                self._pending.append(change)
+
+    def clear(self):
+        with self._lock:
+            self._index = self._built_at = None
+
+    def _rebuild(self):
+        # called holding _rebuilding
+        with self._lock:
+            self._pending = []
+        try:
+            index = self.build()
+        except Exception:
+            with self._lock:
+                # the old index stays in use; the next try is a ttl later
+                self._built_at, self._pending = time.monotonic(), None
+            raise
+        with self._lock:
+            for change in self._pending:
+                change(index)
+            self._index, self._built_at, self._pending = index, time.monotonic(), None
+        return index
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self._rebuild()
+        except Exception:
+            logger.exception('Index rebuild failed')
+        finally:
+            self._rebuilding.release()
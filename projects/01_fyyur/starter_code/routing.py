@@ -0,0 +1,104 @@
+import random
+import time
+from threading import Lock
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.engine.url import make_url
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'read_primary_until'
+
+
+def read_only(f):
+    """Marks a view that only reads, e.g. a search form posted with POST."""
+    f.read_only = True
+    return f
+
+
+def is_read_request():
+    view = current_app.view_functions.get(request.endpoint)
+    return request.method in READ_METHODS or getattr(view, 'read_only', False)
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends the statements of read requests to a replica.
+
+    A replica is picked once per session, so a request sees one replica
+    throughout, and again after close(). Write requests, code running
+    outside of a request and clients that wrote within the last
+    SQLALCHEMY_READ_YOUR_WRITES_SECONDS use the primary. GET, HEAD and
+    OPTIONS requests and views marked with read_only() are reads.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._reads_from_replica():
+            if not hasattr(self, '_replica'):
+                self._replica = random.choice(self.db.replica_engines(self.app))
+            return self._replica
+        return super().get_bind(mapper, clause)
+
+    def close(self):
+        self.__dict__.pop('_replica', None)
+        super().close()
+
+    def _reads_from_replica(self):
+        if not self.app.config['SQLALCHEMY_REPLICA_URIS'] or not has_request_context():
+            return False
+        return is_read_request() and not self.db.pinned_to_primary()
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy with read replicas listed in SQLALCHEMY_REPLICA_URIS."""
+
+    def __init__(self, *args, **kwargs):
+        self._replicas = {}
+        self._replicas_lock = Lock()
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+        app.config.setdefault('SQLALCHEMY_READ_YOUR_WRITES_SECONDS', 5)
+        super().init_app(app)
+        app.after_request(self._pin_after_write)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def replica_engines(self, app):
+        with self._replicas_lock:
+            engines = []
+            for uri in app.config['SQLALCHEMY_REPLICA_URIS']:
+                if uri not in self._replicas:
+                    sa_url = make_url(uri)
+                    options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'], echo=app.config['SQLALCHEMY_ECHO'])
+                    self.apply_driver_hacks(app, sa_url, options)
+                    self._replicas[uri] = self.create_engine(sa_url, options)
+                engines.append(self._replicas[uri])
+            return engines
+
+    def pinned_to_primary(self):
+        # the pin is a plain timestamp cookie rather than part of the signed
+        # session, so every worker can honour it whatever its SECRET_KEY; a
+        # client can only use it to read from the primary, and for no longer
+        # than a write would have pinned it
+        try:
+            until = float(request.cookies.get(PIN_COOKIE, 0))
+        except ValueError:
+            return False
+        now = time.time()
+        return now < until <= now + self.get_app().config['SQLALCHEMY_READ_YOUR_WRITES_SECONDS']
+
+    def _pin_after_write(self, response):
+        # the client reads its own writes, e.g. after the redirect of an edit,
+        # from the primary until the replicas have caught up
+        app = self.get_app()
+        if app.config['SQLALCHEMY_REPLICA_URIS'] and not is_read_request():
+            seconds = app.config['SQLALCHEMY_READ_YOUR_WRITES_SECONDS']
+            response.set_cookie(PIN_COOKIE, '{0:.3f}'.format(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+        return response
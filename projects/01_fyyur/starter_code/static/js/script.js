@@ -1,4 +1,31 @@
 window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
-};
\ No newline at end of file
+};
+// Type-ahead for the search boxes: suggestions come from /autocomplete and
+// picking one opens its page.
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+  var list = document.getElementById(input.getAttribute('list'));
+  var urls = {};
+  var pending = null;
+  input.addEventListener('input', function () {
+    if (urls[input.value]) {
+      window.location = urls[input.value];
+      return;
+    }
+    clearTimeout(pending);
+    pending = setTimeout(function () {
+      var url = '/autocomplete?type=' + input.dataset.autocomplete + '&q=' + encodeURIComponent(input.value);
+      fetch(url).then(function (response) { return response.json(); }).then(function (suggestions) {
+        urls = {};
+        list.innerHTML = '';
+        suggestions.forEach(function (suggestion) {
+          var option = document.createElement('option');
+          option.value = suggestion.name;
+          urls[suggestion.name] = suggestion.url;
+          list.appendChild(option);
+        });
+      });
+    }, 100);
+  });
+});
@@ -0,0 +1,673 @@
+import base64
+import babel.dates
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import render_template_string, url_for
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
+from werkzeug.http import http_date
+
+from app import app, db, page_cache, venue_bookings, match_indexes, name_index, instrumentation, request_logger, Venue, VenueGenre, Artist, ArtistGenre, Show, count_show, roll_over_shows, load_detail, genre_mask, ShowListing, refresh_show_listing
+from instrumentation import QueryBudgetExceeded
+from autocomplete import PrefixIndex
+from refreshing import RefreshingIndex
+from formatting import DateTimeFormatter, patterns
+from async_logging import DroppingQueueHandler, BatchingRotatingFileHandler, BatchingListener
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app = app
+        self.client = self.app.test_client
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        page_cache.clear()
+        venue_bookings.clear()
+        for index in match_indexes.values():
+            index.clear()
+        name_index.clear()
+
+    def tearDown(self):
+        """Executed after each test"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    @contextmanager
+    def count_queries(self):
+        statements = []
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    def seed(self, num_venues):
+        artist = Artist(name='Artist', city='San Francisco', state='CA')
+        db.session.add(artist)
+        for i in range(num_venues):
+            venue = Venue(name='Venue {0}'.format(i), city='City {0}'.format(i % 3), state='CA', address='Street {0}'.format(i))
+            db.session.add(venue)
+            db.session.flush()
+            for start_time in (datetime.now() + timedelta(days=1), datetime.now() - timedelta(days=1)):
+                show = Show(artist_id=artist.id, venue_id=venue.id, start_time=start_time)
+                db.session.add(show)
+                count_show(show)
+        db.session.flush()
+        refresh_show_listing()
+        db.session.commit()
+        return artist
+
+    def test_venues_groups_by_area_with_upcoming_shows(self):
+        self.seed(4)
+        res = self.client().get('/venues')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'City 0, CA', res.data)
+        self.assertIn(b'Venue 3', res.data)
+
+    def test_venues_query_count_is_constant(self):
+        self.seed(2)
+        with self.count_queries() as few:
+            self.client().get('/venues')
+        self.seed(20)
+        page_cache.clear()
+        with self.count_queries() as many:
+            self.client().get('/venues')
+
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(many), 1)
+
+    def test_show_counts_follow_creates_roll_overs_and_deletes(self):
+        artist_id = self.seed(2).id
+        venue_id = Venue.query.first().id
+        start_time = datetime.now() + timedelta(hours=1)
+        self.client().post('/shows/create', data={'artist_id': artist_id, 'venue_id': venue_id, 'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S')})
+        venue, artist = Venue.query.get(venue_id), Artist.query.get(artist_id)
+
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (2, 1))
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (3, 2))
+
+        self.assertEqual(roll_over_shows(now=start_time), 1)
+        db.session.commit()
+
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (1, 2))
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (2, 3))
+
+        res = self.client().delete('/venues/{0}'.format(venue_id))
+        artist = Artist.query.get(artist_id)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIsNone(Venue.query.get(venue_id))
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (1, 1))
+
+    def test_deletes_cascade_in_the_database_and_keep_counts(self):
+        artist_id = self.seed(3).id
+        venue_ids = [venue.id for venue in Venue.query.order_by(Venue.id)]
+        for venue_id in venue_ids:
+            db.session.add(VenueGenre(venue_id=venue_id, name='Jazz'))
+        db.session.commit()
+
+        with self.count_queries() as statements:
+            res = self.client().delete('/venues/{0}'.format(venue_ids[0]))
+        deletes = [statement for statement in statements if statement.startswith('DELETE')]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(deletes), 1)
+        self.assertIn('"Venue"', deletes[0])
+        self.assertEqual(Show.query.filter_by(venue_id=venue_ids[0]).count(), 0)
+        self.assertEqual(VenueGenre.query.filter_by(venue_id=venue_ids[0]).count(), 0)
+        artist = Artist.query.get(artist_id)
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (2, 2))
+
+        res = self.client().delete('/venues', json={'ids': venue_ids[1:]})
+        artist = Artist.query.get(artist_id)
+
+        self.assertEqual(res.get_json()['deleted'], 2)
+        self.assertEqual((Show.query.count(), VenueGenre.query.count()), (0, 0))
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (0, 0))
+        self.assertEqual(self.client().delete('/venues/{0}'.format(venue_ids[0])).status_code, 404)
+        self.assertEqual(self.client().delete('/venues', json={'ids': 'all'}).status_code, 400)
+
+    def test_read_requests_go_to_a_replica_until_the_client_writes(self):
+        path = os.path.join(tempfile.mkdtemp(), 'replica.db')
+        app.config['SQLALCHEMY_REPLICA_URIS'] = ['sqlite:///' + path]
+        self.addCleanup(app.config.__setitem__, 'SQLALCHEMY_REPLICA_URIS', [])
+        replica = db.replica_engines(app)[0]
+        db.metadata.create_all(bind=replica)
+        replica.execute(Venue.__table__.insert(), {'name': 'Replica Venue', 'city': 'City', 'state': 'CA', 'address': 'Street'})
+        db.session.add(Venue(name='Primary Venue', city='City', state='CA', address='Street'))
+        db.session.commit()
+        client = self.client()
+        def venue_names(client):
+            return [venue['name'] for venue in client.get('/api/v1/venues').get_json()]
+
+        self.assertEqual(venue_names(client), ['Replica Venue'])
+        self.assertIn(b'Replica Venue', client.post('/venues/search', data={'search_term': 'venue'}).data)
+        self.assertEqual(venue_names(client), ['Replica Venue'])
+
+        client.post('/venues/create', data={'name': 'New Venue', 'city': 'City', 'state': 'CA', 'address': 'Street', 'phone': '415-555-0100', 'genres': ['Jazz']})
+        # another worker, with its own SECRET_KEY, honours the pin too
+        self.addCleanup(app.config.__setitem__, 'SECRET_KEY', app.config['SECRET_KEY'])
+        app.config['SECRET_KEY'] = os.urandom(32)
+
+        self.assertEqual(venue_names(client), ['Primary Venue', 'New Venue'])
+        self.assertEqual(venue_names(self.client()), ['Replica Venue'])
+        forged = self.client()
+        forged.set_cookie('localhost', 'read_primary_until', str(time.time() + 3600))
+        self.assertEqual(venue_names(forged), ['Replica Venue'])
+        replica.dispose()
+
+    def test_create_show_rejects_overlapping_bookings_at_a_venue(self):
+        artist_id = self.seed(2).id
+        venue_id, other_venue_id = [venue.id for venue in Venue.query.order_by(Venue.id)]
+        start_time = datetime.now().replace(microsecond=0) + timedelta(days=2)
+        def book(venue_id, start_time, duration):
+            self.client().post('/shows/create', data={'artist_id': artist_id, 'venue_id': venue_id, 'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'), 'duration': duration})
+            return Show.query.filter_by(venue_id=venue_id, start_time=start_time).count()
+
+        self.assertEqual(book(venue_id, start_time, 90), 1)
+        self.assertEqual(book(venue_id, start_time - timedelta(minutes=30), 60), 0)
+        self.assertEqual(book(venue_id, start_time + timedelta(minutes=89), 60), 0)
+        self.assertEqual(book(venue_id, start_time + timedelta(minutes=90), 60), 1)
+        self.assertEqual(book(other_venue_id, start_time, 90), 1)
+        for duration in (0, -60, 'long'):
+            self.assertEqual(book(other_venue_id, start_time + timedelta(days=1), duration), 0)
+        self.assertEqual(Venue.query.get(venue_id).upcoming_shows_count, 3)
+
+    def test_matches_rank_seeking_artists_by_shared_genres_and_follow_edits(self):
+        venue = Venue(name='Venue', city='San Francisco', state='CA', address='Street', genre_mask=genre_mask(['Jazz', 'Blues', 'Soul']))
+        artists = [
+            Artist(name='Two genres elsewhere', city='Oakland', state='CA', seeking_venue=True, genre_mask=genre_mask(['Jazz', 'Blues'])),
+            Artist(name='One genre', city='San Francisco', state='CA', seeking_venue=True, genre_mask=genre_mask(['Soul', 'Folk'])),
+            Artist(name='Two genres here', city='San Francisco', state='CA', seeking_venue=True, genre_mask=genre_mask(['Blues', 'Soul'])),
+            Artist(name='Not seeking', city='San Francisco', state='CA', seeking_venue=False, genre_mask=genre_mask(['Jazz'])),
+            Artist(name='Other state', city='New York', state='NY', seeking_venue=True, genre_mask=genre_mask(['Jazz']))
+        ]
+        db.session.add_all([venue] + artists)
+        db.session.commit()
+        venue_id, artist_ids = venue.id, [artist.id for artist in artists]
+
+        with self.count_queries() as statements:
+            matches = self.client().get('/venues/{0}/matches'.format(venue_id)).get_json()
+
+        self.assertEqual([match['name'] for match in matches], ['Two genres here', 'Two genres elsewhere', 'One genre'])
+        self.assertEqual(matches[0]['genres'], ['Blues', 'Soul'])
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(self.client().get('/venues/{0}/matches?limit=1'.format(venue_id)).get_json()), 1)
+
+        self.client().post('/artists/{0}/edit'.format(artist_ids[0]), data={'name': 'Two genres elsewhere', 'city': 'Oakland', 'state': 'CA', 'phone': '415-555-0100', 'genres': ['Jazz']})
+        self.client().post('/artists/create', data={'name': 'New', 'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0100', 'genres': ['Jazz', 'Blues', 'Soul'], 'seeking_venue': 'y'})
+        self.client().delete('/artists/{0}'.format(artist_ids[2]))
+
+        with self.count_queries() as statements:
+            matches = self.client().get('/venues/{0}/matches'.format(venue_id)).get_json()
+
+        self.assertEqual([match['name'] for match in matches], ['New', 'One genre'])
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(self.client().get('/venues/0/matches').status_code, 404)
+
+    def test_stale_index_answers_while_one_background_rebuild_replays_updates(self):
+        started, release, builds = threading.Event(), threading.Event(), []
+        def build():
+            builds.append(len(builds))
+            if len(builds) > 1:
+                started.set()
+                release.wait(5)
+            return {'rows': ['db {0}'.format(len(builds))]}
+        index = RefreshingIndex(app, build, ttl=0)
+
+        self.assertEqual(index.get(), {'rows': ['db 1']})
+        old = index.get()
+        started.wait(5)
+        index.ttl = 60
+        self.assertIs(index.get(), old)
+        index.update(lambda rows: rows['rows'].append('written'))
+        release.set()
+        for _ in range(100):
+            if index.get() is not old:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(index.get()['rows'], ['db 2', 'written'])
+        self.assertEqual(old['rows'], ['db 1', 'written'])
+        self.assertEqual(len(builds), 2)
+
+    def test_calendars_stream_shows_and_answer_conditional_gets(self):
+        artist_id = self.seed(2).id
+        venue_id = Venue.query.order_by(Venue.id).first().id
+        db.session.query(Artist).filter_by(id=artist_id).update({'name': 'Long, long; name ' + 'x' * 80})
+        db.session.commit()
+
+        res = self.client().get('/venues/{0}/calendar.ics'.format(venue_id))
+        body = res.get_data(as_text=True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'text/calendar')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Long\\, long\\; name', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+        self.assertEqual(res.last_modified, db.session.query(Artist.updated_at).filter_by(id=artist_id).scalar().replace(microsecond=0))
+        last_modified = res.headers['Last-Modified']
+
+        with self.count_queries() as statements:
+            res = self.client().get('/venues/{0}/calendar.ics'.format(venue_id), headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(self.client().get('/venues/{0}/calendar.ics'.format(venue_id), headers={'If-Modified-Since': last_modified}).status_code, 304)
+        self.assertEqual(self.client().get('/venues/{0}/calendar.ics'.format(venue_id), headers={'If-Modified-Since': http_date(datetime.utcnow() - timedelta(hours=1))}).status_code, 200)
+
+        etag = res.headers['ETag']
+        self.client().post('/shows/create', data={'artist_id': artist_id, 'venue_id': venue_id, 'start_time': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')})
+        res = self.client().get('/venues/{0}/calendar.ics'.format(venue_id), headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_data(as_text=True).count('BEGIN:VEVENT'), 3)
+        self.assertEqual(self.client().get('/artists/{0}/calendar.ics'.format(artist_id)).get_data(as_text=True).count('BEGIN:VEVENT'), 5)
+        self.assertEqual(self.client().get('/artists/0/calendar.ics').status_code, 404)
+
+    def test_shows_page_reads_the_listing_kept_current_by_handlers(self):
+        artist_id = self.seed(2).id
+        venue_ids = [venue.id for venue in Venue.query.order_by(Venue.id)]
+
+        with self.count_queries() as statements:
+            res = self.client().get('/shows')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('FROM "ShowListing"', statements[0])
+        self.assertNotIn('JOIN', statements[0])
+        self.assertEqual(res.data.count(b'Venue 1'), 2)
+
+        self.client().post('/shows/create', data={'artist_id': artist_id, 'venue_id': venue_ids[0], 'start_time': (datetime.now() + timedelta(days=9)).strftime('%Y-%m-%d %H:%M:%S')})
+        self.client().post('/artists/{0}/edit'.format(artist_id), data={'name': 'Renamed', 'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0100', 'genres': ['Jazz'], 'image_link': 'http://example.com/a.png'})
+        self.client().delete('/venues/{0}'.format(venue_ids[1]))
+
+        listing = ShowListing.query.all()
+        self.assertEqual(len(listing), 3)
+        self.assertEqual({(show.venue_id, show.artist_name, show.artist_image_link) for show in listing}, {(venue_ids[0], 'Renamed', 'http://example.com/a.png')})
+        refresh_show_listing()
+        self.assertEqual(len(ShowListing.query.all()), 3)
+
+    def test_autocomplete_suggests_names_by_word_prefix_and_follows_writes(self):
+        self.seed(2)
+        def suggest(q, **args):
+            return [suggestion['name'] for suggestion in self.client().get('/autocomplete', query_string=dict(args, q=q)).get_json()]
+
+        self.assertEqual(suggest('ven'), ['Venue 0', 'Venue 1'])
+        self.assertEqual(suggest('ART'), ['Artist'])
+        self.assertEqual(suggest('1', type='venue'), ['Venue 1'])
+        self.assertEqual(suggest('ven', limit=1), ['Venue 0'])
+        self.assertEqual(suggest(' '), [])
+        self.assertEqual(self.client().get('/autocomplete?q=a&type=show').status_code, 400)
+
+        self.client().post('/venues/create', data={'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': 'Street', 'phone': '415-555-0100', 'genres': ['Jazz']})
+        venue_id = Venue.query.filter_by(name='The Musical Hop').one().id
+        with self.count_queries() as statements:
+            res = self.client().get('/autocomplete?q=mus')
+
+        self.assertEqual(res.get_json(), [{'type': 'venue', 'id': venue_id, 'name': 'The Musical Hop', 'url': '/venues/{0}'.format(venue_id)}])
+        self.assertEqual(statements, [])
+
+        self.client().delete('/venues/{0}'.format(venue_id))
+        db.session.add(Artist(name='Musician', city='San Francisco', state='CA'))
+        db.session.commit()
+
+        self.assertEqual(suggest('mus'), [])
+        self.assertEqual(self.client().post('/autocomplete/reload').get_json()['names'], 4)
+        self.assertEqual(suggest('mus'), ['Musician'])
+
+    def test_prefix_index_merges_its_delta_and_folds_it_in(self):
+        index = PrefixIndex([('venue', 1, 'The Musical Hop'), ('venue', 2, 'Park Square'), ('artist', 1, 'Guns N Petals')], max_delta=4)
+        index.add('venue', 2, 'Musicians Park')
+        index.add('artist', 2, 'The Wild Sax Band')
+        index.remove('venue', [1])
+
+        self.assertEqual(index.lookup('mus'), [('venue', 2, 'Musicians Park')])
+        self.assertEqual(index.lookup('the'), [('artist', 2, 'The Wild Sax Band')])
+        self.assertEqual(index.lookup('squ'), [])
+        self.assertEqual(len(index), 3)
+
+        index.add('venue', 3, 'The Dueling Pianos Bar')
+        self.assertEqual(index._snapshot.delta_names, {})
+        self.assertEqual(index.lookup('the', limit=5), PrefixIndex([('venue', 2, 'Musicians Park'), ('artist', 1, 'Guns N Petals'), ('artist', 2, 'The Wild Sax Band'), ('venue', 3, 'The Dueling Pianos Bar')]).lookup('the', limit=5))
+
+    def test_search_venues_matches_name_location_and_genre_in_one_query(self):
+        self.seed(3)
+        db.session.add(Venue(name='Jazz Corner', city='New York', state='NY', address='Street', genres=[VenueGenre(name='Blues'), VenueGenre(name='Jazz')]))
+        db.session.commit()
+        with self.count_queries() as statements:
+            by_name = self.client().post('/venues/search', data={'search_term': 'jazz'})
+
+        self.assertEqual(len(statements), 1)
+        self.assertIn(b'search results for "jazz": 1', by_name.data)
+        self.assertIn(b'Jazz Corner', by_name.data)
+
+        by_location = self.client().post('/venues/search', data={'search_term': 'New York, NY'})
+        by_genre = self.client().post('/venues/search', data={'search_term': 'blues'})
+
+        self.assertIn(b'Jazz Corner', by_location.data)
+        self.assertIn(b'Jazz Corner', by_genre.data)
+
+    def test_search_pages_are_consistent_and_the_count_is_capped(self):
+        self.addCleanup(app.config.__setitem__, 'SEARCH_PAGE_SIZE', app.config['SEARCH_PAGE_SIZE'])
+        self.addCleanup(app.config.__setitem__, 'SEARCH_COUNT_LIMIT', app.config['SEARCH_COUNT_LIMIT'])
+        app.config['SEARCH_PAGE_SIZE'] = 2
+        app.config['SEARCH_COUNT_LIMIT'] = 3
+        for name in ('Hall Two', 'Big Hall', 'Hall One', 'Small Hall', 'Hall Three'):
+            db.session.add(Venue(name=name, city='Hallstatt', state='CA', address='Street', genres=[VenueGenre(name='Jazz')]))
+        db.session.commit()
+
+        pages = [self.client().get('/api/v1/venues/search?search_term=hall&page={0}'.format(page)).get_json() for page in (1, 2, 3)]
+        names = [venue['name'] for page in pages for venue in page['data']]
+        form = self.client().post('/venues/search', data={'search_term': 'hall'})
+
+        self.assertEqual(names[:3], ['Hall Two', 'Hall One', 'Hall Three'])
+        self.assertEqual(sorted(names), sorted(['Hall Two', 'Big Hall', 'Hall One', 'Small Hall', 'Hall Three']))
+        self.assertEqual([page['has_next'] for page in pages], [True, True, False])
+        self.assertEqual((pages[0]['count'], pages[0]['count_capped']), (3, True))
+        self.assertIn(b'search results for "hall": 3+', form.data)
+
+    def test_venue_detail_loads_in_one_query_and_caps_past_shows(self):
+        artist_id = self.seed(1).id
+        venue = Venue.query.first()
+        venue.genres = [VenueGenre(name='Jazz'), VenueGenre(name='R&B')]
+        for days in range(1, 4):
+            show = Show(artist_id=artist_id, venue_id=venue.id, start_time=datetime.now() - timedelta(days=days, hours=1))
+            db.session.add(show)
+            count_show(show)
+        db.session.commit()
+
+        data = load_detail(Venue, venue.id, past_limit=2)
+
+        self.assertEqual(sorted(data['genres']), ['Jazz', 'R&B'])
+        self.assertEqual((data['upcoming_shows_count'], data['past_shows_count']), (1, 4))
+        self.assertEqual(len(data['past_shows']), 2)
+        self.assertLess(data['past_shows'][0]['start_time'], data['past_shows'][1]['start_time'])
+
+        data = load_detail(Venue, venue.id, past_since=datetime.now() - timedelta(days=2))
+
+        self.assertEqual(len(data['past_shows']), 2)
+        self.assertEqual((data['upcoming_shows_count'], data['past_shows_count']), (1, 4))
+        with self.count_queries() as statements:
+            res = self.client().get('/venues/{0}'.format(venue.id))
+
+        self.assertEqual(res.status_code, 200)
+        # the ETag check and the detail load
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(self.client().get('/venues/1000').status_code, 404)
+
+    def test_detail_pages_answer_conditional_gets_before_loading(self):
+        artist_id = self.seed(2).id
+        venue_id = Venue.query.order_by(Venue.id).first().id
+        artist_page = '/artists/{0}'.format(artist_id)
+        etag = self.client().get(artist_page).headers['ETag']
+        page_cache.clear()
+
+        with self.count_queries() as statements:
+            res = self.client().get(artist_page, headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('JOIN "VenueGenre"', statements[0])
+        self.assertEqual(res.headers['ETag'], etag)
+
+        self.client().get(artist_page)
+        with self.count_queries() as statements:
+            self.assertEqual(self.client().get(artist_page, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(len(statements), 0)
+
+        shows_updated_at = db.session.query(db.func.max(Show.updated_at)).scalar()
+        client = self.client()
+        client.post('/venues/{0}/edit'.format(venue_id), data={'name': 'Renamed', 'city': 'City', 'state': 'CA', 'address': 'Street', 'genres': ['Jazz']})
+        res = self.client().get(artist_page, headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(db.session.query(db.func.max(Show.updated_at)).scalar(), shows_updated_at)
+        self.assertIn(b'Renamed', res.data)
+        renamed_etag = res.headers['ETag']
+        venue_etag = self.client().get('/venues/{0}'.format(venue_id)).headers['ETag']
+        # the pending flash message of the edit is rendered, not answered with 304
+        self.assertEqual(client.get('/venues/{0}'.format(venue_id), headers={'If-None-Match': venue_etag}).status_code, 200)
+
+        page_cache.clear()
+        self.client().post('/shows/create', data={'artist_id': artist_id, 'venue_id': venue_id, 'start_time': (datetime.now() + timedelta(days=9)).strftime('%Y-%m-%d %H:%M:%S')})
+
+        self.assertEqual(self.client().get(artist_page, headers={'If-None-Match': renamed_etag}).status_code, 200)
+        self.assertEqual(self.client().get('/artists/0', headers={'If-None-Match': etag}).status_code, 404)
+
+    def test_pages_are_cached_until_a_write_invalidates_them(self):
+        artist_id = self.seed(1).id
+        hits = page_cache.stats()['hits']
+        venue_id = Venue.query.first().id
+        venue_page = '/venues/{0}'.format(venue_id)
+
+        self.assertEqual(self.client().get(venue_page).headers['X-Cache'], 'MISS')
+        with self.count_queries() as statements:
+            self.assertEqual(self.client().get(venue_page).headers['X-Cache'], 'HIT')
+        self.assertEqual(len(statements), 0)
+
+        self.client().get('/artists/{0}'.format(artist_id))
+        self.client().post('/venues/{0}/edit'.format(venue_id), data={'name': 'Renamed', 'city': 'City', 'state': 'CA', 'address': 'Street', 'genres': ['Jazz']})
+        self.assertEqual(self.client().get(venue_page).headers['X-Cache'], 'MISS')
+        artist_page = self.client().get('/artists/{0}'.format(artist_id))
+
+        self.assertEqual(artist_page.headers['X-Cache'], 'MISS')
+        self.assertIn(b'Renamed', artist_page.data)
+        self.assertEqual(page_cache.stats()['hits'], hits + 1)
+
+    def test_artists_keyset_pagination_walks_forward_and_back(self):
+        self.addCleanup(app.config.__setitem__, 'LISTING_PAGE_SIZE', app.config['LISTING_PAGE_SIZE'])
+        app.config['LISTING_PAGE_SIZE'] = 2
+        for name in ('Dee', 'Abe', 'Cid', 'Bob', 'Eve'):
+            db.session.add(Artist(name=name, city='City', state='CA'))
+        db.session.commit()
+
+        first = self.client().get('/artists')
+        second = self.client().get('/artists?after=' + self.cursor(first, 'after'))
+        third = self.client().get('/artists?after=' + self.cursor(second, 'after'))
+        back = self.client().get('/artists?before=' + self.cursor(third, 'before'))
+
+        self.assertIn(b'Abe', first.data)
+        self.assertNotIn(b'before=', first.data)
+        self.assertIn(b'Cid', second.data)
+        self.assertIn(b'Dee', second.data)
+        self.assertIn(b'Eve', third.data)
+        self.assertNotIn(b'after=', third.data)
+        self.assertEqual(back.data, second.data)
+        self.assertEqual(self.client().get('/artists?after=garbage').status_code, 400)
+        def encoded(values):
+            return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        for values in ([{'a': 1}, 1], ['Abe', '1'], ['Abe', True], {'Abe': 1}):
+            self.assertEqual(self.client().get('/artists?after=' + encoded(values)).status_code, 400)
+        self.assertEqual(self.client().get('/shows?after=' + encoded(['2020-01-01T00:00:00', [1], 2])).status_code, 400)
+        self.assertEqual(self.client().get('/shows?after=' + encoded(['2020-01-01T00:00:00', 1, 2])).status_code, 200)
+
+    def cursor(self, res, direction):
+        return re.search(r'{0}=([^"&]+)'.format(direction), res.get_data(as_text=True)).group(1)
+
+    def test_edit_artist_reconciles_genres_with_one_select(self):
+        artist = Artist(name='Artist', city='City', state='CA', genres=[ArtistGenre(name='Jazz'), ArtistGenre(name='Blues')])
+        db.session.add(artist)
+        db.session.commit()
+        artist_id = artist.id
+        with self.count_queries() as statements:
+            self.client().post('/artists/{0}/edit'.format(artist_id), data={'name': 'Artist', 'city': 'City', 'state': 'CA', 'genres': ['Blues', 'Soul', 'Funk']})
+
+        genres = db.session.query(ArtistGenre.name).filter(ArtistGenre.artist_id == artist_id).order_by(ArtistGenre.name).all()
+        self.assertEqual([name for (name,) in genres], ['Blues', 'Funk', 'Soul'])
+        self.assertEqual(len([statement for statement in statements if 'ArtistGenre' in statement]), 3)
+
+    def test_import_streams_validated_rows_in_batches(self):
+        path = os.path.join(tempfile.mkdtemp(), 'venues.csv')
+        with open(path, 'w') as f:
+            f.write('name,city,state,address,phone,genres,website,facebook_link,image_link\n')
+            for i in range(5):
+                f.write('Venue {0},Austin,TX,Street,555,"Jazz,Blues",http://a.com,http://fb.com/a,http://img.com/a\n'.format(i))
+            f.write('Nowhere,Austin,XX,Street,555,Jazz,http://a.com,http://fb.com/a,http://img.com/a\n')
+
+        result = self.app.test_cli_runner().invoke(args=['import', 'venues', path, '--batch-size', '2'])
+
+        self.assertIn('5 imported, 1 rejected', result.output)
+        self.assertEqual(Venue.query.count(), 5)
+        self.assertEqual(VenueGenre.query.count(), 10)
+
+    def test_api_streams_shows_as_json_array_or_ndjson(self):
+        artist_id = self.seed(3).id
+        app.config['API_STREAM_BATCH_SIZE'] = 2
+        self.addCleanup(app.config.__setitem__, 'API_STREAM_BATCH_SIZE', 500)
+
+        res = self.client().get('/api/v1/shows')
+        shows = json.loads(res.data)
+
+        self.assertEqual(res.mimetype, 'application/json')
+        self.assertEqual(len(shows), 6)
+        self.assertEqual(shows, sorted(shows, key=lambda show: show['start_time']))
+        self.assertEqual(shows[0]['artist_id'], artist_id)
+
+        res = self.client().get('/api/v1/shows?venue_id={0}'.format(shows[0]['venue_id']), headers={'Accept': 'application/x-ndjson'})
+        lines = res.data.decode().splitlines()
+
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['venue_id'], shows[0]['venue_id'])
+
+        res = self.client().get('/api/v1/artists/{0}'.format(artist_id))
+        self.assertEqual(json.loads(res.data)['upcoming_shows_count'], 3)
+
+        res = self.client().get('/api/v1/venues/search?search_term=venue')
+        self.assertEqual(json.loads(res.data)['count'], 3)
+
+        res = self.client().get('/api/v1/venues/999')
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(json.loads(res.data)['success'], False)
+
+    def test_facets_count_genres_and_states_from_genre_masks(self):
+        for name, state, genres in (('A', 'NY', ['Jazz', 'Blues']), ('B', 'NY', ['Jazz']), ('C', 'CA', ['Jazz', 'Rock n Roll'])):
+            self.client().post('/venues/create', data={'name': name, 'city': 'City', 'state': state, 'address': 'Street', 'genres': genres})
+        venue_id = Venue.query.filter_by(name='B').one().id
+        self.client().post('/venues/{0}/edit'.format(venue_id), data={'name': 'B', 'city': 'City', 'state': 'NY', 'address': 'Street', 'genres': ['Jazz', 'Soul']})
+
+        with self.count_queries() as statements:
+            res = self.client().get('/api/v1/venues/facets?genre=Jazz&state=NY')
+        facets = json.loads(res.data)
+        genres = {genre['name']: genre['count'] for genre in facets['genres']}
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(facets['count'], 2)
+        self.assertEqual(facets['states'], [{'state': 'NY', 'count': 2}])
+        self.assertEqual((genres['Jazz'], genres['Blues'], genres['Soul'], genres['Rock n Roll']), (2, 1, 1, 0))
+
+        res = self.client().get('/api/v1/venues?genre=Jazz&genre=Soul')
+        self.assertEqual([venue['name'] for venue in json.loads(res.data)], ['B'])
+
+        res = self.client().get('/api/v1/venues/facets?genre=Polka')
+        self.assertEqual(res.status_code, 400)
+
+    def test_read_routes_stay_within_their_query_budgets(self):
+        ids = {'artist_id': self.seed(3).id, 'venue_id': Venue.query.first().id}
+        rules = [rule for rule in app.url_map.iter_rules() if hasattr(app.view_functions[rule.endpoint], 'query_budget')]
+        instrumentation.reset()
+        for rule in rules:
+            with app.test_request_context():
+                url = url_for(rule.endpoint, **{arg: ids[arg] for arg in rule.arguments})
+            if 'GET' in rule.methods:
+                res = self.client().get(url, query_string={'search_term': 'Venue'})
+            else:
+                res = self.client().post(url, data={'search_term': 'Venue'})
+            self.assertEqual(res.status_code, 200, url)
+        routes = instrumentation.stats()['routes']
+
+        self.assertGreater(len(rules), 10)
+        for rule in rules:
+            self.assertLessEqual(routes[rule.endpoint]['max_queries'], app.view_functions[rule.endpoint].query_budget, rule.endpoint)
+
+        app.view_functions['venues'].query_budget = 0
+        self.addCleanup(setattr, app.view_functions['venues'], 'query_budget', 1)
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client().get('/venues')
+
+        res = self.client().get('/metrics')
+        self.assertIn('page_cache', res.get_json())
+
+    def test_datetime_formatter_matches_babel_and_memoizes(self):
+        formatter = DateTimeFormatter('en')
+        values = [datetime(2019, 5, 21, 21, 30), datetime(2035, 4, 1, 9, 5), datetime(2035, 4, 1, 9, 5)]
+        for format in ('full', 'medium', 'y-MM-dd HH:mm'):
+            self.assertEqual(formatter.format_many(values, format), [babel.dates.format_datetime(value, patterns.get(format, format), locale='en') for value in values])
+        self.assertEqual(formatter.format.cache_info().hits, 3)
+
+        rendered = render_template_string("{{ values|datetimes('full')|join('|') }}", values=values)
+
+        self.assertEqual(rendered, '|'.join(babel.dates.format_datetime(value, patterns['full'], locale=babel.dates.LC_TIME) for value in values))
+
+    def test_compile_templates_fills_the_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(setattr, app.jinja_env, 'bytecode_cache', app.jinja_env.bytecode_cache)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        app.jinja_env.cache.clear()
+
+        res = app.test_cli_runner().invoke(args=['compile-templates'])
+
+        templates = app.jinja_env.list_templates(extensions=['html'])
+        self.assertEqual(res.output, 'Compiled {0} templates.\n'.format(len(templates)))
+        self.assertEqual(len([name for name in os.listdir(cache_dir) if name.endswith('.cache')]), len(templates))
+
+    def test_request_records_are_queued_and_written_in_rotated_batches(self):
+        self.seed(2)
+        log_dir = tempfile.mkdtemp()
+        path = os.path.join(log_dir, 'requests.log')
+        log_queue = queue.Queue(100)
+        queue_handler = DroppingQueueHandler(log_queue)
+        file_handler = BatchingRotatingFileHandler(path, maxBytes=300, backupCount=2, delay=True)
+        listener = BatchingListener(log_queue, [file_handler], batch_size=2)
+        request_logger.addHandler(queue_handler)
+        request_logger.setLevel(logging.INFO)
+        self.addCleanup(request_logger.setLevel, logging.NOTSET)
+        self.addCleanup(request_logger.removeHandler, queue_handler)
+
+        for _ in range(3):
+            self.client().get('/venues')
+        self.client().get('/venues/0')
+        listener.start()
+        listener.stop()
+        file_handler.close()
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertTrue(os.path.exists(path + '.1'))
+        self.assertEqual(records[-1]['route'], 'show_venue')
+        self.assertEqual(records[-1]['status'], 404)
+        with open(path + '.1') as f:
+            venues = json.loads(f.readline())
+        self.assertEqual((venues['route'], venues['method'], venues['status']), ('venues', 'GET', 200))
+        self.assertGreater(venues['queries'], 0)
+        self.assertGreater(venues['render_ms'], 0)
+
+        for i in range(101):
+            request_logger.info('record %d', i)
+        self.assertEqual(queue_handler.dropped, 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()